@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import time
+from collections import namedtuple
+from uuid import uuid4
+
+from django.conf import settings
+from django.db import transaction
+from shuup.core import cache
+
+from shuup_api_permission.local_cache import LocalCache
+from shuup_api_permission.models import APIAccess
+
+API_ACCESS_CACHE_KEY_FMT = "api_access_{key}"
+API_ACCESS_STAMP_CACHE_KEY_FMT = "api_access_stamp_{key}"
+
+# The stamps and records are invalidated by renewing the stamps, so they are stored with a fixed
+# version instead of the namespace version of `shuup.core.cache`, which would cost one more
+# lookup in the shared cache in each request.
+API_ACCESS_CACHE_VERSION = 1
+
+# Compact representation of an APIAccess, cheap to keep in memory and to pickle
+# `secret` is the digest of the secret, `stamp` identifies the APIAccess state the record was built from
+APIAccessRecord = namedtuple("APIAccessRecord", [
+    "id", "key", "secret", "enabled", "permission_version", "rate_limit", "user_rate_limit",
+    "max_concurrent_requests", "server_timing", "stamp"
+])
+
+# records indexed by API key, stored together with the time they must be revalidated
+api_access_local_cache = LocalCache("SHUUP_API_ACCESS_LOCAL_CACHE_SIZE")
+
+# API keys that don't exist, mapped to the number of times each key was used
+missing_api_access_cache = LocalCache("SHUUP_API_ACCESS_NEGATIVE_CACHE_SIZE")
+
+
+def _build_api_access_record(api_key, stamp):
+    fields = [field for field in APIAccessRecord._fields if field != "stamp"]
+    try:
+        api_access = APIAccess.objects.values_list(*fields).get(key=api_key)
+    except APIAccess.DoesNotExist:
+        return None
+    return APIAccessRecord(*api_access, stamp=stamp)
+
+
+def _get_shared_api_access_record(api_key, stamp):
+    """
+    Returns the record from the shared cache when it matches the current `stamp`,
+    otherwise load it from the database and update the shared cache
+    """
+    api_access_cache_key = API_ACCESS_CACHE_KEY_FMT.format(key=api_key)
+
+    if stamp:
+        record = cache.get(api_access_cache_key, version=API_ACCESS_CACHE_VERSION)
+        if record and record.stamp == stamp:
+            return record
+
+    record = _build_api_access_record(api_key, stamp or uuid4().hex)
+    if record:
+        if not stamp:
+            cache.set(
+                API_ACCESS_STAMP_CACHE_KEY_FMT.format(key=api_key), record.stamp, version=API_ACCESS_CACHE_VERSION)
+        cache.set(api_access_cache_key, record, version=API_ACCESS_CACHE_VERSION)
+    return record
+
+
+def get_api_access_record(api_key, revalidate=False):
+    """
+    Returns the `APIAccessRecord` for the given API key or None if it doesn't exist
+
+    The record is served from the process memory and only revalidated against
+    the stamp in the shared cache every `SHUUP_API_ACCESS_LOCAL_CACHE_TIMEOUT` seconds,
+    or right away when `revalidate` is set.
+    """
+    now = time.time()
+    cached = api_access_local_cache.get(api_key)
+    if cached:
+        record, revalidate_at = cached
+        if now < revalidate_at and not revalidate:
+            return record
+    else:
+        if missing_api_access_cache.incr(api_key) is not None:
+            return None
+
+    stamp = cache.get(API_ACCESS_STAMP_CACHE_KEY_FMT.format(key=api_key), version=API_ACCESS_CACHE_VERSION)
+    if cached and stamp and record.stamp == stamp:
+        new_record = record
+    else:
+        new_record = _get_shared_api_access_record(api_key, stamp)
+
+    if new_record:
+        revalidate_at = now + settings.SHUUP_API_ACCESS_LOCAL_CACHE_TIMEOUT
+        api_access_local_cache.set(api_key, (new_record, revalidate_at))
+    else:
+        api_access_local_cache.delete(api_key)
+        missing_api_access_cache.set(api_key, 0, timeout=settings.SHUUP_API_ACCESS_NEGATIVE_CACHE_TIMEOUT)
+
+    return new_record
+
+
+def reload_api_access_record(api_key):
+    """
+    Returns the `APIAccessRecord` of the given API key as found in the database
+
+    The cached records are invalidated when they don't match it.
+    """
+    record = get_api_access_record(api_key)
+    if record and _build_api_access_record(api_key, record.stamp) != record:
+        invalidate_api_access_record(api_key)
+        record = get_api_access_record(api_key)
+    return record
+
+
+def get_missing_api_key_hits():
+    """
+    Returns a dict with the number of times each unknown API key
+    currently kept in the negative cache of this process was used
+    """
+    return dict(missing_api_access_cache.items())
+
+
+def _renew_stamp(api_key):
+    cache.set(API_ACCESS_STAMP_CACHE_KEY_FMT.format(key=api_key), uuid4().hex, version=API_ACCESS_CACHE_VERSION)
+    api_access_local_cache.delete(api_key)
+    missing_api_access_cache.delete(api_key)
+
+
+def invalidate_api_access_record(api_key):
+    """
+    Invalidate the cached record of the given API key
+
+    The current process is updated immediately while the
+    others notice the new stamp on their next revalidation.
+
+    Within a transaction, the stamp is renewed once more when it is committed:
+    until then, other processes still read the previous state of the API access
+    from the database and could cache it under the first new stamp.
+    """
+    _renew_stamp(api_key)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _renew_stamp(api_key))
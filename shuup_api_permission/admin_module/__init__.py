@@ -6,7 +6,9 @@ from django.utils.translation import ugettext_lazy as _
 from shuup.admin.base import AdminModule, MenuEntry
 from shuup.admin.menu import SETTINGS_MENU_CATEGORY
 from shuup.admin.utils.permissions import get_default_model_permissions
-from shuup.admin.utils.urls import derive_model_url, get_edit_and_list_urls
+from shuup.admin.utils.urls import (
+    admin_url, derive_model_url, get_edit_and_list_urls
+)
 
 from shuup_api_permission.models import APIAccess, APIPermissionGroups
 
@@ -16,7 +18,14 @@ class APIAccessModule(AdminModule):
     breadcrumbs_menu_entry = MenuEntry(text=name, url="shuup_admin:api_access.list")
 
     def get_urls(self):
-        return get_edit_and_list_urls(
+        return [
+            admin_url(
+                "^api_access/metrics/$",
+                "shuup_api_permission.admin_module.views.APIMetricsView",
+                name="api_access.metrics",
+                permissions=get_default_model_permissions(APIAccess)
+            )
+        ] + get_edit_and_list_urls(
             url_prefix="^api_access",
             view_template="shuup_api_permission.admin_module.views.APIAccess%sView",
             name_template="api_access.%s",
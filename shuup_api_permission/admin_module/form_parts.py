@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+from django.db import IntegrityError, transaction
 from django.utils.translation import ugettext_lazy as _
 from shuup.admin.form_part import FormPart, TemplatedFormDef
 
@@ -10,6 +11,50 @@ from shuup_api_permission.admin_module.forms import (
 from shuup_api_permission.models import APIPermissionScope
 
 
+def get_or_create_scope_ids(identifiers):
+    """
+    Returns the ids of the `APIPermissionScope` with the given identifiers, creating the missing ones
+    """
+    identifiers = set(identifiers)
+    scope_ids = dict(APIPermissionScope.objects.filter(identifier__in=identifiers).values_list("identifier", "pk"))
+
+    missing_identifiers = identifiers - set(scope_ids)
+    if missing_identifiers:
+        try:
+            # in a savepoint, so a conflict leaves the transaction usable
+            with transaction.atomic():
+                APIPermissionScope.objects.bulk_create([
+                    APIPermissionScope(identifier=identifier) for identifier in missing_identifiers
+                ])
+        except IntegrityError:
+            # another request created some of the scopes at the same time
+            for identifier in missing_identifiers:
+                APIPermissionScope.objects.get_or_create(identifier=identifier)
+        # bulk_create doesn't set the primary keys with every database
+        scope_ids.update(
+            APIPermissionScope.objects.filter(identifier__in=missing_identifiers).values_list("identifier", "pk")
+        )
+
+    return set(scope_ids.values())
+
+
+def set_scopes(manager, identifiers):
+    """
+    Make the scopes of the many-to-many `manager` match `identifiers`,
+    only adding and removing the ones which changed
+    """
+    scope_ids = get_or_create_scope_ids(identifiers)
+    current_scope_ids = set(manager.values_list("pk", flat=True))
+
+    removed_scope_ids = current_scope_ids - scope_ids
+    if removed_scope_ids:
+        manager.remove(*removed_scope_ids)
+
+    added_scope_ids = scope_ids - current_scope_ids
+    if added_scope_ids:
+        manager.add(*added_scope_ids)
+
+
 class APIAccessFormPart(FormPart):
     priority = -1000
 
@@ -68,9 +113,7 @@ class AnonymousPermissionFormPart(FormPart):
         )
 
     def form_valid(self, form_group):
-        self.object.anonymous_permissions.clear()
-        for scope in form_group["permissions"].get_scopes():
-            self.object.anonymous_permissions.add(APIPermissionScope.objects.get_or_create(identifier=scope)[0])
+        set_scopes(self.object.anonymous_permissions, form_group["permissions"].get_scopes())
         return self.object
 
 
@@ -92,7 +135,5 @@ class PermissionGroupsFormPart(FormPart):
         )
 
     def form_valid(self, form_group):
-        self.object.permissions.clear()
-        for scope in form_group["permissions"].get_scopes():
-            self.object.permissions.add(APIPermissionScope.objects.get_or_create(identifier=scope)[0])
+        set_scopes(self.object.permissions, form_group["permissions"].get_scopes())
         return self.object
@@ -3,8 +3,9 @@ from __future__ import unicode_literals
 
 from django import forms
 from django.contrib.auth.models import Group as PermissionGroup
-from django.core.urlresolvers import reverse_lazy
+from django.core.urlresolvers import get_resolver, get_urlconf, reverse_lazy
 from django.utils.encoding import force_text
+from django.utils.translation import get_language
 from django.utils.translation import ugettext_lazy as _
 from rest_jwt_permission.providers.api_endpoint import APIEndpointScopeProvider
 from shuup.admin.forms.fields import Select2MultipleField
@@ -25,45 +26,82 @@ class ShopBasedModelForm(forms.ModelForm):
         super(ShopBasedModelForm, self).__init__(*args, **kwargs)
 
 
-class APIPermissionsForm(forms.Form):
-    api_view_prefix = "apiview__"
+# the URL resolver the API endpoints catalogues were built from
+# together with the catalogues, indexed by language
+_api_endpoints = None
 
-    def __init__(self, *args, **kwargs):
-        self.title = kwargs.pop("title", None)
-        initial = kwargs.pop("initial", [])
 
-        super(APIPermissionsForm, self).__init__(*args, **kwargs)
+def _build_api_endpoints():
+    scopes = APIEndpointScopeProvider().get_available_scopes()
+    api_scopes = {}
 
-        scopes = APIEndpointScopeProvider().get_available_scopes()
-        api_scopes = {}
+    # group API endpoint scopes
+    for scope in scopes:
+        if scope.view_class not in api_scopes:
+            api_scopes[scope.view_class] = []
+        api_scopes[scope.view_class].append(scope)
 
-        # group API endpoint scopes
-        for scope in scopes:
-            if scope.view_class not in api_scopes:
-                api_scopes[scope.view_class] = []
-            api_scopes[scope.view_class].append(scope)
+    sorted_viewsets = sorted(api_scopes.keys(), key=lambda a: a.__name__)
 
-        sorted_viewsets = sorted(api_scopes.keys(), key=lambda a: a.__name__)
+    api_endpoints = []
+    for viewset in sorted_viewsets:
+        scopes = api_scopes[viewset]
+        choices = [(scope.identifier, "{}: {}".format(scope.method.upper(), scope.path)) for scope in scopes]
 
-        # now add fields for API endpoints
-        for viewset in sorted_viewsets:
-            scopes = api_scopes[viewset]
-            choices = [(scope.identifier, "{}: {}".format(scope.method.upper(), scope.path)) for scope in scopes]
+        viewset_instance = viewset()
+        label = viewset_instance.get_view_name() or viewset.__name__
+
+        help_text = "Module: {}".format(viewset.__module__)
+        if issubclass(viewset, PermissionHelperMixin):
+            help_text = "{}. {}".format(help_text, viewset_instance.get_help_text())
+
+        api_endpoints.append((viewset.__name__, label, help_text, choices))
 
-            viewset_instance = viewset()
-            label = viewset_instance.get_view_name() or viewset.__name__
+    return api_endpoints
 
-            help_text = "Module: {}".format(viewset.__module__)
-            if issubclass(viewset, PermissionHelperMixin):
-                help_text = "{}. {}".format(help_text, viewset_instance.get_help_text())
 
-            choices_ids = [choice[0] for choice in choices]
-            self.fields["{}{}".format(self.api_view_prefix, viewset.__name__)] = forms.MultipleChoiceField(
+def get_api_endpoints():
+    """
+    Returns a list of (viewset name, label, help text, scope choices) for each API viewset
+
+    The list is built once per process, URL configuration and language,
+    as the labels and help texts are translated. Call `clear_api_endpoints`
+    to rebuild it.
+    """
+    global _api_endpoints
+    resolver = get_resolver(get_urlconf())
+    if _api_endpoints is None or _api_endpoints[0] is not resolver:
+        _api_endpoints = (resolver, {})
+
+    language = get_language()
+    api_endpoints = _api_endpoints[1].get(language)
+    if api_endpoints is None:
+        api_endpoints = _api_endpoints[1][language] = _build_api_endpoints()
+    return api_endpoints
+
+
+def clear_api_endpoints():
+    global _api_endpoints
+    _api_endpoints = None
+
+
+class APIPermissionsForm(forms.Form):
+    api_view_prefix = "apiview__"
+
+    def __init__(self, *args, **kwargs):
+        self.title = kwargs.pop("title", None)
+        initial = set(kwargs.pop("initial", []))
+
+        super(APIPermissionsForm, self).__init__(*args, **kwargs)
+
+        # now add fields for API endpoints
+        for viewset_name, label, help_text, choices in get_api_endpoints():
+            self.fields["{}{}".format(self.api_view_prefix, viewset_name)] = forms.MultipleChoiceField(
                 required=False,
                 label=label,
                 help_text=help_text,
                 choices=choices,
-                initial=[v for v in initial if v in choices_ids]
+                initial=[choice[0] for choice in choices if choice[0] in initial]
             )
 
     def get_scopes(self):
@@ -94,17 +132,18 @@ class APIAccessForm(ShopBasedModelForm):
                     }
                 )
             )
-            self.fields["secret"] = forms.CharField(
-                initial=self.instance.secret,
+            # only the digest of the secret is stored, thus it can't be displayed again
+            self.fields["reset_secret"] = forms.BooleanField(
                 required=False,
-                widget=forms.TextInput(
-                    attrs={
-                        "readonly": "readonly",
-                        "placeholder": _("Auto generated secret")
-                    }
-                )
+                label=_("Reset secret"),
+                help_text=_("Generate a new secret. The current one will stop working.")
             )
 
+    def save(self, commit=True):
+        if self.cleaned_data.get("reset_secret"):
+            self.instance.set_secret()
+        return super(APIAccessForm, self).save(commit)
+
 
 class APIPermissionGroupsForm(ShopBasedModelForm):
     class Meta:
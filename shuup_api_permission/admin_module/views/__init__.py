@@ -1,10 +1,12 @@
 # -*- coding: utf-8 -*-
 from .edit import APIAccessEditView, APIPermissionGroupsEditView
 from .list import APIAccessListView, APIPermissionGroupsListView
+from .metrics import APIMetricsView
 
 __all__ = [
     "APIAccessEditView",
     "APIAccessListView",
+    "APIMetricsView",
     "APIPermissionGroupsEditView",
     "APIPermissionGroupsListView"
 ]
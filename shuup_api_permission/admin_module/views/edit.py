@@ -2,6 +2,8 @@
 from __future__ import unicode_literals
 
 from django.db.transaction import atomic
+from django.shortcuts import render
+from django.utils.translation import ugettext_lazy as _
 from shuup.admin.form_part import FormPartsViewMixin, SaveFormPartsMixin
 from shuup.admin.utils.views import CreateOrUpdateView
 
@@ -27,7 +29,19 @@ class APIAccessEditView(SaveFormPartsMixin, FormPartsViewMixin, CreateOrUpdateVi
 
     @atomic
     def form_valid(self, form):
-        return self.save_form_parts(form)
+        response = self.save_form_parts(form)
+        raw_secret = getattr(self.object, "raw_secret", None)
+        if not raw_secret:
+            return response
+
+        # a new secret is only displayed in this response, it is never stored in plain
+        # text, not even in the messages which may be kept in a cookie or in the session
+        return render(self.request, "shuup_api_permission/api_access_secret.jinja", {
+            "title": _("API secret"),
+            "api_access": self.object,
+            "api_secret": raw_secret,
+            "next_url": response.url
+        })
 
 
 class APIPermissionGroupsEditView(SaveFormPartsMixin, FormPartsViewMixin, CreateOrUpdateView):
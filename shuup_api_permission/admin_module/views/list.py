@@ -1,6 +1,11 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+from datetime import timedelta
+
+from django.db.models import Case, F, FloatField, IntegerField, Sum, When
+from django.db.models.functions import Coalesce
+from django.utils.timezone import now
 from django.utils.translation import ugettext_lazy as _
 from shuup.admin.utils.picotable import Column, TextFilter
 from shuup.admin.utils.views import PicotableListView
@@ -29,9 +34,38 @@ class APIAccessListView(PicotableListView):
                 placeholder=_("Filter by key...")
             )
         ),
-        Column("enabled", _("Enabled"))
+        Column("enabled", _("Enabled")),
+        Column("requests_24h", _("Requests (24h)"), sort_field="requests_24h"),
+        Column("errors_24h", _("Errors (24h)"), sort_field="errors_24h"),
+        Column(
+            "average_duration_24h",
+            _("Average duration (24h)"),
+            display="format_average_duration",
+            sort_field="duration_24h"
+        )
     ]
 
+    def get_queryset(self):
+        since = now() - timedelta(hours=24)
+
+        def sum_usage(field, output_field, **filters):
+            return Coalesce(Sum(Case(
+                When(usage__period_start__gte=since, then=F("usage__{}".format(field)), **filters),
+                default=0,
+                output_field=output_field
+            )), 0, output_field=output_field)
+
+        return super(APIAccessListView, self).get_queryset().annotate(
+            requests_24h=sum_usage("request_count", IntegerField()),
+            errors_24h=sum_usage("request_count", IntegerField(), usage__status_class__gte=5),
+            duration_24h=sum_usage("total_duration", FloatField())
+        )
+
+    def format_average_duration(self, instance, *args, **kwargs):
+        if not instance.requests_24h:
+            return ""
+        return "{:.1f} ms".format(instance.duration_24h / instance.requests_24h)
+
 
 class APIPermissionGroupsListView(PicotableListView):
     model = APIPermissionGroups
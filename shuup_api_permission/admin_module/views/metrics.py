@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.http import Http404, HttpResponse
+from django.views.generic import View
+
+from shuup_api_permission.instrumentation import get_collector
+
+
+class APIMetricsView(View):
+    """
+    Exposes the instrumentation measures in the Prometheus text format
+    """
+
+    def get(self, request, *args, **kwargs):
+        collector = get_collector()
+        if collector is None:
+            raise Http404()
+        return HttpResponse(collector.expose(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import hashlib
+
+from django.conf import settings
+from django.utils.encoding import force_bytes
+
+from shuup_api_permission.access_cache import get_api_access_record
+from shuup_api_permission.local_cache import LocalCache
+from shuup_api_permission.models import APIPermissionScope
+from shuup_api_permission.revocation import revocation_list
+
+# anonymous scopes indexed by (API key, permission version)
+anonymous_scopes_cache = LocalCache("SHUUP_API_ANONYMOUS_CACHE_SIZE")
+
+# (token, token identifier, API access record stamp) indexed by (API key, shop id, secret digest)
+anonymous_token_cache = LocalCache("SHUUP_API_ANONYMOUS_CACHE_SIZE")
+
+
+def get_anonymous_scopes(api_access, permission_version):
+    """
+    Returns the frozenset of scopes granted to anonymous users by the API access,
+    which can be an `APIAccess` or its `APIAccessRecord`
+
+    Cached by permission version, which changes whenever the scopes change.
+    """
+    cache_key = (api_access.key, permission_version)
+    scopes = anonymous_scopes_cache.get(cache_key)
+    if scopes is None:
+        scopes = frozenset(
+            APIPermissionScope.objects.filter(apiaccess=api_access.id).values_list("identifier", flat=True)
+        )
+        anonymous_scopes_cache.set(cache_key, scopes)
+    return scopes
+
+
+def _get_token_cache_key(api_key, api_secret, shop):
+    return (api_key, getattr(shop, "pk", None), hashlib.sha256(force_bytes(api_secret)).hexdigest())
+
+
+def get_reusable_anonymous_token(api_key, api_secret, shop):
+    """
+    Returns an anonymous token recently issued for the same API key, secret and shop, or None
+
+    Tokens are only reused while the API access is enabled and unchanged, and until they are revoked.
+    """
+    if not settings.SHUUP_API_ANONYMOUS_TOKEN_REUSE_TIMEOUT:
+        return None
+
+    cache_key = _get_token_cache_key(api_key, api_secret, shop)
+    entry = anonymous_token_cache.get(cache_key)
+    if entry is None:
+        return None
+
+    token, jti, stamp = entry
+    if revocation_list.is_revoked(jti):
+        anonymous_token_cache.delete(cache_key)
+        return None
+
+    # revalidated against the shared cache, so a secret reset in another process takes effect right away
+    api_access = get_api_access_record(api_key, revalidate=True)
+    if not api_access or not api_access.enabled or api_access.stamp != stamp:
+        return None
+    return token
+
+
+def store_anonymous_token(api_key, api_secret, shop, token, jti):
+    timeout = settings.SHUUP_API_ANONYMOUS_TOKEN_REUSE_TIMEOUT
+    if not timeout:
+        return
+
+    api_access = get_api_access_record(api_key)
+    if api_access:
+        anonymous_token_cache.set(
+            _get_token_cache_key(api_key, api_secret, shop), (token, jti, api_access.stamp), timeout=timeout
+        )
@@ -3,14 +3,14 @@ from datetime import datetime
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from rest_framework import exceptions, viewsets
+from rest_framework import exceptions, status, viewsets
 from rest_framework.decorators import list_route
 from rest_framework.response import Response
 from rest_framework_jwt.settings import api_settings
 
 from shuup_api_permission.serializers import (
     JSONWebTokenSerializer, RefreshJSONWebTokenSerializer,
-    VerifyJSONWebTokenSerializer
+    RevokeJSONWebTokenSerializer, VerifyJSONWebTokenSerializer
 )
 
 jwt_response_payload_handler = api_settings.JWT_RESPONSE_PAYLOAD_HANDLER
@@ -29,6 +29,8 @@ class APIAuthView(viewsets.GenericViewSet):
             return RefreshJSONWebTokenSerializer
         elif self.action == "verify":
             return VerifyJSONWebTokenSerializer
+        elif self.action == "revoke":
+            return RevokeJSONWebTokenSerializer
         raise exceptions.NotFound()
 
     def create(self, request, *args, **kwargs):
@@ -42,6 +44,12 @@ class APIAuthView(viewsets.GenericViewSet):
     def verify(self, request):
         return self.token_auth_refresh(request)
 
+    @list_route(methods=["post"])
+    def revoke(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(True)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
     def token_auth_refresh(self, request):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(True)
@@ -14,3 +14,6 @@ class AppConfig(shuup.apps.AppConfig):
             "shuup_api_permission.api:populate_api"
         ]
     }
+
+    def ready(self):
+        import shuup_api_permission.signal_handlers  # noqa: F401
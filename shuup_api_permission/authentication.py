@@ -5,33 +5,36 @@ from rest_framework import exceptions
 from rest_framework.authentication import BaseAuthentication
 from rest_framework_jwt.settings import api_settings
 
-from shuup_api_permission.utils import get_jwt_from_request, get_jwt_payload
+from shuup_api_permission.context import get_auth_context
+from shuup_api_permission.instrumentation import instrumented
+from shuup_api_permission.user_cache import resolve_user
 
 jwt_get_username_from_payload = api_settings.JWT_PAYLOAD_GET_USERNAME_HANDLER
+jwt_get_user_id_from_payload = api_settings.JWT_PAYLOAD_GET_USER_ID_HANDLER
 
 
 class APITokenAuthentication(BaseAuthentication):
     www_authenticate_realm = 'api'
 
+    @instrumented("authentication")
     def authenticate(self, request):
         """
         Returns a two-tuple of `User` and token if a valid signature has been
         supplied using JWT-based authentication.  Otherwise returns `None`.
         """
-        payload = getattr(request, "jwt_payload", None)
-        jwt_value = getattr(request, "jwt_value", None)
-        if not payload:
-            jwt_value = get_jwt_from_request(request)
-            payload = get_jwt_payload(jwt_value)
+        context = get_auth_context(request)
+        payload = context.payload
 
         if not payload:
             return None
 
-        user = self.authenticate_credentials(payload)
+        with context.timing("user"):
+            user = self.authenticate_credentials(payload)
         if not user:
             return None
 
-        return (user, jwt_value)
+        context.user = user
+        return (user, context.jwt_value)
 
     def authenticate_credentials(self, payload):
         """
@@ -45,7 +48,7 @@ class APITokenAuthentication(BaseAuthentication):
             return None
 
         try:
-            user = user_model.objects.get_by_natural_key(username)
+            user = resolve_user(username, jwt_get_user_id_from_payload(payload))
         except user_model.DoesNotExist:
             raise exceptions.AuthenticationFailed(_('Invalid signature.'))
 
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+
+from shuup_api_permission.counter_cache import cache
+
+CONCURRENCY_CACHE_KEY_FMT = "api_concurrency:{key}:{window}"
+
+# a request in progress, `cache_key` is the shared counter it was added to
+ConcurrencyLease = namedtuple("ConcurrencyLease", ["key", "cache_key"])
+
+
+class ConcurrencyLimiter(object):
+    """
+    Counts the requests in progress for each key, within the process and across processes
+
+    The process count is checked first, so a process never goes over the limit without
+    touching the cache. The count across processes is kept in the shared cache, split in
+    windows of `SHUUP_API_CONCURRENCY_LEASE_TIMEOUT` seconds: a request is counted in the
+    window it started and the requests in progress are those of the current and the
+    previous windows. The leases of crashed workers are never released, they are
+    forgotten when their window expires.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = {}
+
+    def _add_local(self, key, value):
+        with self._lock:
+            active = self._active.get(key, 0) + value
+            if active > 0:
+                self._active[key] = active
+            else:
+                self._active.pop(key, None)
+
+    def get_active(self, key):
+        """
+        Returns the number of requests in progress in this process
+        """
+        return self._active.get(key, 0)
+
+    def acquire(self, key, limit):
+        """
+        Returns a `ConcurrencyLease` or None if `limit` requests are already in progress
+        """
+        with self._lock:
+            active = self._active.get(key, 0)
+            if active >= limit:
+                return None
+            self._active[key] = active + 1
+
+        timeout = settings.SHUUP_API_CONCURRENCY_LEASE_TIMEOUT
+        window = int(time.time() // timeout)
+        cache_key = CONCURRENCY_CACHE_KEY_FMT.format(key=key, window=window)
+
+        cache.add(cache_key, 0, timeout * 2)
+        try:
+            count = cache.incr(cache_key)
+        except ValueError:
+            # the counter was evicted right after being added
+            cache.set(cache_key, 1, timeout * 2)
+            count = 1
+        count += cache.get(CONCURRENCY_CACHE_KEY_FMT.format(key=key, window=window - 1), default=0)
+
+        lease = ConcurrencyLease(key, cache_key)
+        if count > limit:
+            self.release(lease)
+            return None
+        return lease
+
+    def release(self, lease):
+        self._add_local(lease.key, -1)
+        try:
+            cache.decr(lease.cache_key)
+        except ValueError:
+            # the lease expired
+            pass
+
+
+concurrency_limiter = ConcurrencyLimiter()
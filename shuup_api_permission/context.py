@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from timeit import default_timer
+
+from django.utils.functional import cached_property
+
+from shuup_api_permission.access_cache import get_api_access_record
+from shuup_api_permission.concurrency import concurrency_limiter
+from shuup_api_permission.utils import get_decoded_jwt, get_jwt_from_request
+
+
+class APIAuthContext(object):
+    """
+    The authentication data of a request
+
+    Shared by the authentication and permission classes, so the token
+    is parsed and the API access is fetched at most once per request.
+    Everything is computed on first access and memoized, so requests
+    that never use it pay nothing.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        # set by `APITokenAuthentication`
+        self.user = None
+        # set by `APIAccessPermission`, released by `ShuupAPIPermissionMiddleware`
+        self.concurrency_lease = None
+        # set by `APIScopePermission`
+        self.scope = None
+        # set by `ShuupAPIPermissionMiddleware`
+        self.started_at = None
+        # milliseconds spent in each authentication stage, in the order they were measured
+        self.timings = OrderedDict()
+
+    @contextmanager
+    def timing(self, stage):
+        """
+        Add the time spent in the block to the given stage
+        """
+        start = default_timer()
+        try:
+            yield
+        finally:
+            self.timings[stage] = self.timings.get(stage, 0) + (default_timer() - start) * 1000
+
+    @cached_property
+    def jwt_value(self):
+        with self.timing("token"):
+            return get_jwt_from_request(self.request)
+
+    @cached_property
+    def decoded_jwt(self):
+        jwt_value = self.jwt_value
+        with self.timing("decode"):
+            return get_decoded_jwt(jwt_value)
+
+    @property
+    def payload(self):
+        return self.decoded_jwt.payload
+
+    @property
+    def scopes(self):
+        return self.decoded_jwt.scopes
+
+    @cached_property
+    def api_access(self):
+        """
+        The `APIAccessRecord` of the token API key or None
+        """
+        api_key = self.payload.get("api_key")
+        if not api_key:
+            return None
+        return get_api_access_record(api_key)
+
+    def release(self):
+        """
+        Release the resources held for the request
+        """
+        if self.concurrency_lease is not None:
+            concurrency_limiter.release(self.concurrency_lease)
+            self.concurrency_lease = None
+
+
+def get_auth_context(request):
+    """
+    Returns the `APIAuthContext` of the request, creating it when needed
+
+    The context is attached to the Django request, so it is shared by
+    the middleware and the DRF request wrapping it.
+    """
+    http_request = getattr(request, "_request", request)
+    context = getattr(http_request, "api_auth_context", None)
+    if context is None:
+        context = http_request.api_auth_context = APIAuthContext(http_request)
+    return context
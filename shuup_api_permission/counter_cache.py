@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from shuup.core.cache import VersionedCache
+
+
+class CounterCache(VersionedCache):
+    """
+    `shuup.core.cache` together with the atomic operations of the cache backend
+
+    Used for the counters shared by the processes. The keys are versioned
+    and stored in the same cache as those of `shuup.core.cache`.
+    """
+
+    def add(self, key, value, timeout):
+        return self._cache.add(key, value, timeout=timeout, version=self.get_version(key))
+
+    def incr(self, key, delta=1):
+        return self._cache.incr(key, delta, version=self.get_version(key))
+
+    def decr(self, key, delta=1):
+        return self._cache.decr(key, delta, version=self.get_version(key))
+
+
+cache = CounterCache(using="default")
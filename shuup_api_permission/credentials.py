@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import threading
+
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections
+from rest_framework.exceptions import Throttled
+
+from shuup_api_permission.hashing import hash_secret
+from shuup_api_permission.instrumentation import instrumented
+from shuup_api_permission.local_cache import LocalCache
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:  # Python 2 without the `futures` backport
+    ThreadPoolExecutor = None
+
+# user ids indexed by the digest of the verified credentials and the user password hash
+verified_credentials_cache = LocalCache("SHUUP_API_CREDENTIALS_CACHE_SIZE")
+
+
+def _authenticate(credentials):
+    return authenticate(**credentials)
+
+
+def _check_password(user, password):
+    # as `ModelBackend`, for a user already loaded
+    is_active = getattr(user, "is_active", None)
+    if user.check_password(password) and (is_active or is_active is None):
+        return user
+    return None
+
+
+def _run_in_pool(verification, *args):
+    # runs in a pool thread, which has its own database connection
+    close_old_connections()
+    try:
+        return verification(*args)
+    finally:
+        close_old_connections()
+
+
+class CredentialVerifier(object):
+    """
+    Verifies the credentials in a bounded thread pool
+
+    Password hashers are slow on purpose, so a burst of logins could keep every
+    worker busy. At most `SHUUP_API_AUTH_POOL_SIZE` verifications run at the same
+    time, `SHUUP_API_AUTH_QUEUE_SIZE` more can wait for a free thread and the other
+    requests are rejected right away with a 429 response. The pool is created again
+    when `SHUUP_API_AUTH_POOL_SIZE` changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pool_size = None
+        self._pending = 0
+
+    def _done(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    def _get_executor(self, pool_size):
+        if self._executor is None or self._pool_size != pool_size:
+            if ThreadPoolExecutor is None:
+                raise ImproperlyConfigured("SHUUP_API_AUTH_POOL_SIZE requires the `futures` package on Python 2.")
+            if self._executor is not None:
+                # the verifications in progress complete in the previous pool
+                self._executor.shutdown(wait=False)
+            self._executor = ThreadPoolExecutor(max_workers=pool_size)
+            self._pool_size = pool_size
+        return self._executor
+
+    def get_pending(self):
+        """
+        Returns the number of verifications running or waiting for a thread
+        """
+        return self._pending
+
+    def verify(self, credentials, user=None):
+        """
+        Returns the authenticated user or None, raises `Throttled` when the pool is saturated
+
+        When the user matching the credentials is given, its password is checked
+        without loading it again.
+        """
+        if user is not None:
+            verification, args = _check_password, (user, credentials["password"])
+        else:
+            verification, args = _authenticate, (credentials,)
+
+        pool_size = settings.SHUUP_API_AUTH_POOL_SIZE
+        if not pool_size:
+            return verification(*args)
+
+        with self._lock:
+            if self._pending >= pool_size + settings.SHUUP_API_AUTH_QUEUE_SIZE:
+                raise Throttled(wait=settings.SHUUP_API_AUTH_RETRY_AFTER)
+            executor = self._get_executor(pool_size)
+            self._pending += 1
+
+        try:
+            future = executor.submit(_run_in_pool, verification, *args)
+        except Exception:
+            self._done(None)
+            raise
+
+        future.add_done_callback(self._done)
+        return future.result()
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._pool_size = None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+credential_verifier = CredentialVerifier()
+
+
+def _get_credentials_cache_key(username, password, password_hash):
+    return hash_secret("\0".join((username, password, password_hash)))
+
+
+@instrumented("credentials")
+def authenticate_credentials(username_field, username, password):
+    """
+    Returns the active user matching the credentials or None
+
+    When `SHUUP_API_CREDENTIALS_CACHE_TIMEOUT` is set, credentials verified recently
+    are accepted without running the password hasher again. The cache key includes the
+    current password hash of the user, so changing the password invalidates it, and the
+    user loaded for it is verified as is, so a cache miss queries the user only once.
+    """
+    timeout = settings.SHUUP_API_CREDENTIALS_CACHE_TIMEOUT
+    cache_key = None
+    cached_user = None
+
+    if timeout:
+        user_model = get_user_model()
+        try:
+            user = user_model._default_manager.get_by_natural_key(username)
+        except user_model.DoesNotExist:
+            user = None
+
+        if user is not None and user.password:
+            cache_key = _get_credentials_cache_key(username, password, user.password)
+            if verified_credentials_cache.get(cache_key) == user.pk:
+                return user
+            cached_user = user
+
+    user = credential_verifier.verify({username_field: username, "password": password}, user=cached_user)
+    if user is not None and cache_key is not None and user.is_active:
+        verified_credentials_cache.set(cache_key, user.pk, timeout=timeout)
+    return user
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from collections import defaultdict
+
+from django.db.transaction import atomic
+
+from shuup_api_permission.local_cache import LocalCache
+from shuup_api_permission.models import (
+    APIAccess, APIAccessGroupScopes, APIPermissionGroups
+)
+
+SCOPES_SEPARATOR = "\n"
+
+# ids of the groups granted scopes, indexed by (API key, permission version)
+api_access_groups_cache = LocalCache("SHUUP_API_ACCESS_LOCAL_CACHE_SIZE")
+
+
+@atomic
+def rebuild_api_access_group_scopes(api_access_ids=None):
+    """
+    Recompute the `APIAccessGroupScopes` of the given API accesses, or all of them when None
+    """
+    if api_access_ids is not None:
+        api_access_ids = set(api_access_ids)
+        if not api_access_ids:
+            return
+
+    permission_groups = APIPermissionGroups.objects.all()
+    if api_access_ids is not None:
+        permission_groups = permission_groups.filter(apiaccess__in=api_access_ids)
+
+    group_scopes = defaultdict(set)
+    for api_access_id, group_id, scope in permission_groups.values_list(
+            "apiaccess", "groups", "permissions__identifier"):
+        if not (api_access_id and group_id and scope):
+            continue
+        if api_access_ids is not None and api_access_id not in api_access_ids:
+            continue
+        group_scopes[(api_access_id, group_id)].add(scope)
+
+    existing = APIAccessGroupScopes.objects.all()
+    if api_access_ids is not None:
+        existing = existing.filter(api_access_id__in=api_access_ids)
+    existing.delete()
+
+    APIAccessGroupScopes.objects.bulk_create([
+        APIAccessGroupScopes(
+            api_access_id=api_access_id,
+            group_id=group_id,
+            scopes=SCOPES_SEPARATOR.join(sorted(scopes))
+        )
+        for (api_access_id, group_id), scopes in group_scopes.items()
+    ])
+
+
+def get_api_access_ids(**lookup):
+    return list(APIAccess.objects.filter(**lookup).values_list("pk", flat=True).distinct())
+
+
+def get_user_group_scopes(api_access, user):
+    """
+    Returns the sets of scopes granted to the user through the API access,
+    indexed by the ids of the groups granting them
+
+    This is a single indexed lookup on `APIAccessGroupScopes`.
+    """
+    group_scopes = APIAccessGroupScopes.objects.filter(
+        api_access_id=api_access.id,
+        group_id__in=user.groups.values("pk")
+    ).values_list("group_id", "scopes")
+
+    return dict(
+        (group_id, set(scope for scope in scopes_value.split(SCOPES_SEPARATOR) if scope))
+        for group_id, scopes_value in group_scopes
+    )
+
+
+def get_user_scopes(api_access, user):
+    """
+    Returns the set of scopes granted to the user through the API access
+    """
+    scopes = set()
+    for group_scopes in get_user_group_scopes(api_access, user).values():
+        scopes.update(group_scopes)
+    return scopes
+
+
+def get_api_access_group_ids(api_access, permission_version):
+    """
+    Returns the frozenset of ids of the groups granted scopes through the API access
+
+    Cached by permission version, which changes whenever the group scopes change.
+    """
+    cache_key = (api_access.key, permission_version)
+    group_ids = api_access_groups_cache.get(cache_key)
+    if group_ids is None:
+        group_ids = frozenset(
+            APIAccessGroupScopes.objects.filter(api_access_id=api_access.id).values_list("group_id", flat=True)
+        )
+        api_access_groups_cache.set(cache_key, group_ids)
+    return group_ids
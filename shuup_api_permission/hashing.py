@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import hashlib
+import hmac
+
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+from django.utils.encoding import force_bytes
+
+
+def get_secret_pepper():
+    return settings.SHUUP_API_SECRET_PEPPER or settings.SECRET_KEY
+
+
+def hash_secret(secret):
+    """
+    Returns the HMAC-SHA256 hex digest of the API secret, keyed with the server pepper
+
+    API secrets are long random strings, so a fast keyed hash is enough
+    to protect them, unlike passwords which need a slow hash.
+    """
+    return hmac.new(force_bytes(get_secret_pepper()), force_bytes(secret), hashlib.sha256).hexdigest()
+
+
+def check_secret(secret, secret_hash):
+    """
+    Returns whether the API secret matches the digest, in constant time
+    """
+    return bool(secret and secret_hash) and constant_time_compare(hash_secret(secret), secret_hash)
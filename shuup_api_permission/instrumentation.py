@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import threading
+from bisect import bisect_left
+from functools import wraps
+from timeit import default_timer
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# upper bounds, in milliseconds, of the histogram buckets
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000)
+
+DURATION_METRIC = "shuup_api_permission_duration_milliseconds"
+
+
+class Histogram(object):
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        # the last count is for the values above the last bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def get_cumulative_counts(self):
+        """
+        Returns a list of (upper bound, number of values lower or equal to it)
+        """
+        cumulative_counts = []
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            cumulative_counts.append((bound, total))
+        return cumulative_counts
+
+
+class BaseCollector(object):
+    """
+    Receives the duration of the authentication stages
+
+    Set `SHUUP_API_INSTRUMENTATION_COLLECTOR` to the path of a subclass
+    to send the measures somewhere else.
+    """
+
+    def observe(self, stage, duration):
+        """
+        :param duration: the stage duration in milliseconds
+        """
+        raise NotImplementedError()
+
+    def expose(self):
+        """
+        Returns the collected measures in the Prometheus text format
+        """
+        raise NotImplementedError()
+
+
+class InMemoryCollector(BaseCollector):
+    """
+    Keeps a histogram of each stage duration in the process memory
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+
+    def observe(self, stage, duration):
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.observe(duration)
+
+    def expose(self):
+        lines = ["# TYPE %s histogram" % DURATION_METRIC]
+        with self._lock:
+            for stage, histogram in sorted(self.histograms.items()):
+                for bound, count in histogram.get_cumulative_counts():
+                    lines.append('%s_bucket{stage="%s",le="%s"} %d' % (
+                        DURATION_METRIC, stage, "+Inf" if bound == float("inf") else bound, count
+                    ))
+                lines.append('%s_sum{stage="%s"} %f' % (DURATION_METRIC, stage, histogram.sum))
+                lines.append('%s_count{stage="%s"} %d' % (DURATION_METRIC, stage, histogram.count))
+
+        lines.extend(_expose_cache_stats())
+        return "\n".join(lines) + "\n"
+
+
+def get_local_caches():
+    """
+    Returns the in-process caches indexed by name
+    """
+    from shuup_api_permission.access_cache import api_access_local_cache
+    from shuup_api_permission.user_cache import user_snapshot_cache
+    from shuup_api_permission.utils import jwt_payload_cache
+    return {
+        "jwt_payload": jwt_payload_cache,
+        "api_access": api_access_local_cache,
+        "user": user_snapshot_cache
+    }
+
+
+def _expose_cache_stats():
+    lines = []
+    cache_stats = {}
+    for name, local_cache in get_local_caches().items():
+        stats = cache_stats[name] = local_cache.get_stats()
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = (float(stats["hits"]) / lookups) if lookups else 0
+
+    for metric, stat, metric_type in (
+        ("hits_total", "hits", "counter"),
+        ("misses_total", "misses", "counter"),
+        ("hit_ratio", "hit_ratio", "gauge")
+    ):
+        lines.append("# TYPE shuup_api_permission_cache_%s %s" % (metric, metric_type))
+        for name, stats in sorted(cache_stats.items()):
+            lines.append('shuup_api_permission_cache_%s{cache="%s"} %s' % (metric, name, stats[stat]))
+    return lines
+
+
+_collector = None
+_collector_settings = None
+_collector_lock = threading.Lock()
+
+
+def get_collector():
+    """
+    Returns the configured collector or None when the instrumentation is disabled
+
+    The collector is created again when its settings change.
+    """
+    global _collector, _collector_settings
+    collector_settings = (settings.SHUUP_API_INSTRUMENTATION_ENABLED, settings.SHUUP_API_INSTRUMENTATION_COLLECTOR)
+    if collector_settings != _collector_settings:
+        with _collector_lock:
+            if collector_settings != _collector_settings:
+                enabled, collector_class = collector_settings
+                _collector = import_string(collector_class)() if enabled else None
+                _collector_settings = collector_settings
+    return _collector
+
+
+def reset_collector():
+    """
+    Discards the collector and its measures, e.g. between tests
+    """
+    global _collector, _collector_settings
+    with _collector_lock:
+        _collector = None
+        _collector_settings = None
+
+
+def instrumented(stage):
+    """
+    Decorator measuring the duration of the function as the given stage
+
+    When the instrumentation is disabled, it only costs reading its settings.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            collector = get_collector()
+            if collector is None:
+                return func(*args, **kwargs)
+
+            start = default_timer()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                collector.observe(stage, (default_timer() - start) * 1000)
+        return wrapper
+    return decorator
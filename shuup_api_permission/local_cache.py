@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class LocalCache(object):
+    """
+    Thread-safe, size bounded in-process LRU cache with per-entry expiration
+
+    The maximum number of entries is read from the Django setting
+    named by `size_setting` whenever an entry is stored.
+    """
+
+    def __init__(self, size_setting):
+        self.size_setting = size_setting
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= now:
+                self.misses += 1
+                return default
+
+            # re-insert to mark the entry as the most recently used
+            self._entries[key] = entry
+            self.hits += 1
+            return value
+
+    def set(self, key, value, timeout=None):
+        """
+        Store `value` under `key`, expiring it after `timeout` seconds
+        or never when `timeout` is None
+        """
+        expires_at = (time.time() + timeout) if timeout is not None else None
+        max_size = getattr(settings, self.size_setting)
+
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (expires_at, value)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def incr(self, key, delta=1):
+        """
+        Add `delta` to the number stored under `key` and return
+        the new value, or None when there is no such entry
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or (entry[0] is not None and entry[0] <= now):
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            value += delta
+            self._entries[key] = (expires_at, value)
+            self.hits += 1
+            return value
+
+    def items(self):
+        """
+        Returns a list of the (key, value) pairs not expired yet
+        """
+        now = time.time()
+        with self._lock:
+            return [
+                (key, value) for key, (expires_at, value) in self._entries.items()
+                if expires_at is None or expires_at > now
+            ]
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
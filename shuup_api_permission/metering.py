@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import logging
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connections, IntegrityError
+from django.db.models import Case, F, FloatField, IntegerField, Value, When
+from django.db.transaction import atomic
+from django.utils import timezone
+
+from shuup_api_permission.models import APIAccess, APIAccessUsage
+
+LOGGER = logging.getLogger(__name__)
+
+# the usage is aggregated by hour
+USAGE_PERIOD = 3600
+
+
+def _get_period_start(timestamp):
+    if settings.USE_TZ:
+        return datetime.fromtimestamp(timestamp, timezone.utc)
+    return datetime.fromtimestamp(timestamp)
+
+
+@atomic
+def save_usage(counters):
+    """
+    Add the counters to the `APIAccessUsage` rows, creating the missing ones
+
+    :param counters: maps (API access id, period start timestamp, scope, status class)
+        to [request count, total duration]
+    """
+    api_access_ids = set(APIAccess.objects.filter(
+        pk__in=set(key[0] for key in counters)
+    ).values_list("pk", flat=True))
+    counters = dict(
+        ((api_access_id, _get_period_start(period), scope, status_class), values)
+        for (api_access_id, period, scope, status_class), values in counters.items()
+        if api_access_id in api_access_ids
+    )
+
+    existing_usage = APIAccessUsage.objects.filter(
+        api_access_id__in=api_access_ids,
+        period_start__in=set(key[1] for key in counters)
+    ).values_list("pk", "api_access_id", "period_start", "scope", "status_class")
+    existing_usage_ids = dict((tuple(row[1:]), row[0]) for row in existing_usage)
+
+    new_usage = []
+    updated_usage = {}
+    for key, values in counters.items():
+        usage_id = existing_usage_ids.get(key)
+        if usage_id:
+            updated_usage[usage_id] = values
+        else:
+            api_access_id, period_start, scope, status_class = key
+            request_count, total_duration = values
+            new_usage.append(APIAccessUsage(
+                api_access_id=api_access_id,
+                period_start=period_start,
+                scope=scope,
+                status_class=status_class,
+                request_count=request_count,
+                total_duration=total_duration
+            ))
+
+    if updated_usage:
+        # a single statement adds the counters of every existing row
+        APIAccessUsage.objects.filter(pk__in=updated_usage).update(
+            request_count=F("request_count") + Case(
+                *[When(pk=pk, then=Value(values[0])) for pk, values in updated_usage.items()],
+                output_field=IntegerField()
+            ),
+            total_duration=F("total_duration") + Case(
+                *[When(pk=pk, then=Value(values[1])) for pk, values in updated_usage.items()],
+                output_field=FloatField()
+            )
+        )
+    if new_usage:
+        APIAccessUsage.objects.bulk_create(new_usage)
+
+
+class UsageMeter(object):
+    """
+    Aggregates the requests of the process in memory and saves them in batches
+
+    The counters are saved when `SHUUP_API_METERING_FLUSH_SIZE` keys are pending or
+    `SHUUP_API_METERING_FLUSH_INTERVAL` seconds passed since the last save, in a background
+    thread started by the request which reached the threshold. At most one save runs at a
+    time. Counters pending when the process exits are lost.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._flushed_at = time.time()
+        self._flush_thread = None
+
+    def _merge(self, counters):
+        with self._lock:
+            for key, (request_count, total_duration) in counters.items():
+                values = self._counters.setdefault(key, [0, 0.0])
+                values[0] += request_count
+                values[1] += total_duration
+
+    def record(self, api_access_id, scope, status_class, duration):
+        """
+        Count a request
+
+        :param duration: the request duration in milliseconds
+        """
+        now = time.time()
+        key = (api_access_id, int(now // USAGE_PERIOD) * USAGE_PERIOD, scope, status_class)
+
+        with self._lock:
+            values = self._counters.setdefault(key, [0, 0.0])
+            values[0] += 1
+            values[1] += duration
+            should_flush = self._flush_thread is None and (
+                len(self._counters) >= settings.SHUUP_API_METERING_FLUSH_SIZE or
+                now - self._flushed_at >= settings.SHUUP_API_METERING_FLUSH_INTERVAL
+            )
+            if should_flush:
+                self._flush_thread = threading.Thread(target=self._flush_in_background)
+                self._flush_thread.daemon = True
+                self._flush_thread.start()
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        except Exception:
+            LOGGER.exception("Failed to save the API usage")
+        finally:
+            # the thread has its own database connections
+            connections.close_all()
+            with self._lock:
+                self._flush_thread = None
+
+    def flush(self):
+        with self._lock:
+            counters, self._counters = self._counters, {}
+            self._flushed_at = time.time()
+
+        if not counters:
+            return
+
+        try:
+            save_usage(counters)
+        except IntegrityError:
+            # another process created some of the rows at the same time,
+            # they will be updated on the next flush
+            self._merge(counters)
+
+    def join(self, timeout=None):
+        """
+        Wait for the background save in progress, if any
+        """
+        thread = self._flush_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def clear(self):
+        self.join()
+        with self._lock:
+            self._counters = {}
+            self._flushed_at = time.time()
+
+
+usage_meter = UsageMeter()
+
+
+def record_request_usage(context, status_code):
+    """
+    Count the request of the given `APIAuthContext`
+    """
+    # only the requests whose API access was resolved are counted, it is not resolved here
+    api_access = context.__dict__.get("api_access")
+    if not api_access or context.started_at is None:
+        return
+
+    duration = (time.time() - context.started_at) * 1000
+    usage_meter.record(api_access.id, context.scope or "", status_code // 100, duration)
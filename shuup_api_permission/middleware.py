@@ -1,17 +1,86 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
-from shuup_api_permission.utils import get_jwt_from_request, get_jwt_payload
+import time
+
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+from rest_framework_jwt.settings import api_settings
+
+from shuup_api_permission.context import get_auth_context
+from shuup_api_permission.metering import record_request_usage
 
 
 class ShuupAPIPermissionMiddleware(object):
     """
-    Read the JWT from the request and the payload as a request attribute
-    This will just cache the JWT payload into the request
+    Attach the API authentication context to the request, together
+    with the `jwt_value` and `jwt_payload` attributes, which are None
+    when the request carries no token. Otherwise they are lazy objects,
+    even for a header of another scheme, so test them for truth instead
+    of comparing them with `is None`. Prefer `request.api_auth_context`
+    in new code.
+
+    Nothing is read or decoded until used, and requests outside of
+    `SHUUP_API_PERMISSION_URL_PREFIXES` are skipped entirely.
+
+    Responses to requests made with outdated tokens, when these are
+    not rejected, are flagged with the `X-API-Token-Outdated` header
+
+    The concurrency leases taken by `APIAccessPermission` are released
+    once the response is ready, even if the view failed.
+
+    When `SHUUP_API_METERING_ENABLED` is set, the requests are counted
+    in the usage of their API access.
+
+    When `SHUUP_API_SERVER_TIMING_ENABLED` or the `server_timing` flag of
+    the API access is set, the time spent in each authentication stage
+    is added to the `Server-Timing` response header.
     """
     def process_request(self, request):
-        jwt = get_jwt_from_request(request)
-        if jwt:
-            payload = get_jwt_payload(jwt)
-            request.jwt_payload = payload
-            request.jwt_value = jwt
+        url_prefixes = settings.SHUUP_API_PERMISSION_URL_PREFIXES
+        if url_prefixes and not request.path.startswith(tuple(url_prefixes)):
+            return
+
+        context = get_auth_context(request)
+        context.started_at = time.time()
+        if self._has_token(request):
+            request.jwt_value = SimpleLazyObject(lambda: context.jwt_value)
+            request.jwt_payload = SimpleLazyObject(lambda: context.payload if context.jwt_value else None)
+        else:
+            request.jwt_value = None
+            request.jwt_payload = None
+
+    def process_exception(self, request, exception):
+        self._release_context(request)
+
+    def process_response(self, request, response):
+        self._release_context(request)
+        context = getattr(request, "api_auth_context", None)
+        if context is not None:
+            if settings.SHUUP_API_METERING_ENABLED:
+                record_request_usage(context, response.status_code)
+            if context.timings and self._is_server_timing_enabled(context):
+                response["Server-Timing"] = ", ".join(
+                    "{};dur={:.3f}".format(stage, duration) for stage, duration in context.timings.items()
+                )
+        if getattr(request, "api_token_outdated", False):
+            response["X-API-Token-Outdated"] = "true"
+        return response
+
+    def _has_token(self, request):
+        if request.META.get("HTTP_AUTHORIZATION"):
+            return True
+        auth_cookie = api_settings.JWT_AUTH_COOKIE
+        return bool(auth_cookie and request.COOKIES.get(auth_cookie))
+
+    def _is_server_timing_enabled(self, context):
+        if settings.SHUUP_API_SERVER_TIMING_ENABLED:
+            return True
+        # the API access is not resolved only for this
+        api_access = context.__dict__.get("api_access")
+        return bool(api_access and api_access.server_timing)
+
+    def _release_context(self, request):
+        context = getattr(request, "api_auth_context", None)
+        if context is not None:
+            context.release()
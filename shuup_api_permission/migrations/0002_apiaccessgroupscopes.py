@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_group_scopes(apps, schema_editor):
+    APIPermissionGroups = apps.get_model("shuup_api_permission", "APIPermissionGroups")
+    APIAccessGroupScopes = apps.get_model("shuup_api_permission", "APIAccessGroupScopes")
+
+    group_scopes = defaultdict(set)
+    for api_access_id, group_id, scope in APIPermissionGroups.objects.values_list(
+            "apiaccess", "groups", "permissions__identifier"):
+        if api_access_id and group_id and scope:
+            group_scopes[(api_access_id, group_id)].add(scope)
+
+    APIAccessGroupScopes.objects.bulk_create([
+        APIAccessGroupScopes(api_access_id=api_access_id, group_id=group_id, scopes="\n".join(sorted(scopes)))
+        for (api_access_id, group_id), scopes in group_scopes.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0007_alter_validators_add_error_messages'),
+        ('shuup_api_permission', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='APIAccessGroupScopes',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scopes', models.TextField(blank=True, verbose_name='scopes')),
+                ('api_access', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='group_scopes', to='shuup_api_permission.APIAccess')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='auth.Group')),
+            ],
+            options={
+                'verbose_name_plural': 'API access group scopes',
+                'verbose_name': 'API access group scopes',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='apiaccessgroupscopes',
+            unique_together=set([('api_access', 'group')]),
+        ),
+        migrations.RunPython(build_group_scopes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shuup_api_permission', '0002_apiaccessgroupscopes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apiaccess',
+            name='permission_version',
+            field=models.PositiveIntegerField(default=1, editable=False, verbose_name='permission version'),
+        ),
+    ]
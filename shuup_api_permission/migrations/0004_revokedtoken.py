@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shuup_api_permission', '0003_permission_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevokedToken',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jti', models.CharField(max_length=64, unique=True, verbose_name='token identifier')),
+                ('expires_at', models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='expires at')),
+            ],
+            options={
+                'verbose_name_plural': 'revoked tokens',
+                'verbose_name': 'revoked token',
+            },
+        ),
+    ]
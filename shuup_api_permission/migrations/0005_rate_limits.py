@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shuup_api_permission', '0004_revokedtoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apiaccess',
+            name='rate_limit',
+            field=models.PositiveIntegerField(blank=True, help_text='The maximum number of requests per minute made with this API access. Leave empty for no limit.', null=True, verbose_name='rate limit'),
+        ),
+        migrations.AddField(
+            model_name='apiaccess',
+            name='user_rate_limit',
+            field=models.PositiveIntegerField(blank=True, help_text='The maximum number of requests per minute made by each authenticated user with this API access. Leave empty for no limit.', null=True, verbose_name='rate limit per user'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shuup_api_permission', '0005_rate_limits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apiaccess',
+            name='max_concurrent_requests',
+            field=models.PositiveIntegerField(blank=True, help_text='The maximum number of requests made with this API access processed at the same time. Leave empty for no limit.', null=True, verbose_name='maximum concurrent requests'),
+        ),
+    ]
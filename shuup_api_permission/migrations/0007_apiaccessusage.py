@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shuup_api_permission', '0006_max_concurrent_requests'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='APIAccessUsage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateTimeField(db_index=True, verbose_name='period start')),
+                ('scope', models.CharField(blank=True, max_length=250, verbose_name='scope')),
+                ('status_class', models.PositiveSmallIntegerField(verbose_name='status class')),
+                ('request_count', models.PositiveIntegerField(default=0, verbose_name='request count')),
+                ('total_duration', models.FloatField(default=0, verbose_name='total duration')),
+                ('api_access', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage', to='shuup_api_permission.APIAccess')),
+            ],
+            options={
+                'verbose_name_plural': 'API access usage',
+                'verbose_name': 'API access usage',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='apiaccessusage',
+            unique_together=set([('api_access', 'period_start', 'scope', 'status_class')]),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shuup_api_permission', '0007_apiaccessusage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apiaccess',
+            name='server_timing',
+            field=models.BooleanField(default=False, help_text='Add the time spent authenticating each request made with this API access in the Server-Timing response header.', verbose_name='Server-Timing header'),
+        ),
+    ]
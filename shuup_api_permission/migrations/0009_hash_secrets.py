@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+from shuup_api_permission.hashing import hash_secret
+
+
+def hash_secrets(apps, schema_editor):
+    APIAccess = apps.get_model("shuup_api_permission", "APIAccess")
+    for pk, secret in APIAccess.objects.values_list("pk", "secret").iterator():
+        APIAccess.objects.filter(pk=pk).update(secret=hash_secret(secret))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shuup_api_permission', '0008_apiaccess_server_timing'),
+    ]
+
+    operations = [
+        # the digests can't be reverted to the plain secrets
+        migrations.RunPython(hash_secrets),
+    ]
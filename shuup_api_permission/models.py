@@ -6,7 +6,8 @@ from uuid import uuid1, uuid4
 from django.db import models
 from django.utils.encoding import python_2_unicode_compatible
 from django.utils.translation import ugettext_lazy as _
-from shuup.core import cache
+
+from shuup_api_permission.hashing import check_secret, hash_secret
 
 
 @python_2_unicode_compatible
@@ -38,6 +39,7 @@ class APIPermissionGroups(models.Model):
 @python_2_unicode_compatible
 class APIAccess(models.Model):
     key = models.CharField(max_length=128, verbose_name=_("key"), unique=True, editable=False)
+    # digest of the secret, see `shuup_api_permission.hashing`
     secret = models.CharField(max_length=128, verbose_name=_("secret"), editable=False)
     name = models.CharField(max_length=60, verbose_name=_("name"))
     enabled = models.BooleanField(default=True, verbose_name=_("enabled"))
@@ -51,6 +53,35 @@ class APIAccess(models.Model):
         blank=True,
         verbose_name=_("API permission groups")
     )
+    # incremented every time the permissions granted through this API access change
+    permission_version = models.PositiveIntegerField(default=1, editable=False, verbose_name=_("permission version"))
+    rate_limit = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name=_("rate limit"),
+        help_text=_("The maximum number of requests per minute made with this API access. "
+                    "Leave empty for no limit.")
+    )
+    user_rate_limit = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name=_("rate limit per user"),
+        help_text=_("The maximum number of requests per minute made by each authenticated user "
+                    "with this API access. Leave empty for no limit.")
+    )
+    max_concurrent_requests = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name=_("maximum concurrent requests"),
+        help_text=_("The maximum number of requests made with this API access "
+                    "processed at the same time. Leave empty for no limit.")
+    )
+    server_timing = models.BooleanField(
+        default=False,
+        verbose_name=_("Server-Timing header"),
+        help_text=_("Add the time spent authenticating each request made with "
+                    "this API access in the Server-Timing response header.")
+    )
 
     class Meta:
         verbose_name = _("API access")
@@ -63,11 +94,98 @@ class APIAccess(models.Model):
         if not self.key:
             self.key = uuid1().hex
         if not self.secret:
-            self.secret = "{}{}".format(uuid4().hex, uuid4().hex)
+            self.set_secret()
 
-        if self.pk:
-            from shuup_api_permission.permissions import API_ACCESS_CACHE_KEY_FMT
-            api_access_cache_key = API_ACCESS_CACHE_KEY_FMT.format(key=self.key)
-            cache.bump_version(api_access_cache_key)
+        # the permission version is only changed by the signal handlers, through queryset updates,
+        # so saving an instance loaded before a change must not write the old version back
+        if not self._state.adding and not args and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "permission_version"
+            ]
 
         super(APIAccess, self).save(*args, **kwargs)
+
+        from shuup_api_permission.access_cache import invalidate_api_access_record
+        invalidate_api_access_record(self.key)
+
+    def set_secret(self, secret=None):
+        """
+        Set the given secret, or a new random one, and return it
+
+        Only its digest is stored, the plain secret remains available
+        in `raw_secret` until the instance is discarded.
+        """
+        self.raw_secret = secret or "{}{}".format(uuid4().hex, uuid4().hex)
+        self.secret = hash_secret(self.raw_secret)
+        return self.raw_secret
+
+    def check_secret(self, secret):
+        return check_secret(secret, self.secret)
+
+    def delete(self, *args, **kwargs):
+        super(APIAccess, self).delete(*args, **kwargs)
+
+        from shuup_api_permission.access_cache import invalidate_api_access_record
+        invalidate_api_access_record(self.key)
+
+
+@python_2_unicode_compatible
+class APIAccessGroupScopes(models.Model):
+    """
+    The scopes granted to the users of a group through an API access
+
+    This is a denormalization of `APIAccess.permissions_groups`,
+    `APIPermissionGroups.groups` and `APIPermissionGroups.permissions`
+    kept up to date by signal handlers.
+    """
+    api_access = models.ForeignKey(APIAccess, related_name="group_scopes", on_delete=models.CASCADE)
+    group = models.ForeignKey("auth.Group", related_name="+", on_delete=models.CASCADE)
+    # newline separated scope identifiers
+    scopes = models.TextField(blank=True, verbose_name=_("scopes"))
+
+    class Meta:
+        unique_together = ("api_access", "group")
+        verbose_name = _("API access group scopes")
+        verbose_name_plural = _("API access group scopes")
+
+    def __str__(self):
+        return "{} - {}".format(self.api_access_id, self.group_id)
+
+
+@python_2_unicode_compatible
+class RevokedToken(models.Model):
+    jti = models.CharField(max_length=64, unique=True, verbose_name=_("token identifier"))
+    expires_at = models.DateTimeField(null=True, blank=True, db_index=True, verbose_name=_("expires at"))
+
+    class Meta:
+        verbose_name = _("revoked token")
+        verbose_name_plural = _("revoked tokens")
+
+    def __str__(self):
+        return self.jti
+
+
+@python_2_unicode_compatible
+class APIAccessUsage(models.Model):
+    """
+    The requests made with an API access during an hour, for a scope and a status class
+
+    Rows are written in batches by `shuup_api_permission.metering.UsageMeter`.
+    """
+    api_access = models.ForeignKey(APIAccess, related_name="usage", on_delete=models.CASCADE)
+    period_start = models.DateTimeField(db_index=True, verbose_name=_("period start"))
+    scope = models.CharField(max_length=250, blank=True, verbose_name=_("scope"))
+    # the first digit of the response status code, e.g. 2 for 2xx responses
+    status_class = models.PositiveSmallIntegerField(verbose_name=_("status class"))
+    request_count = models.PositiveIntegerField(default=0, verbose_name=_("request count"))
+    # in milliseconds
+    total_duration = models.FloatField(default=0, verbose_name=_("total duration"))
+
+    class Meta:
+        unique_together = ("api_access", "period_start", "scope", "status_class")
+        verbose_name = _("API access usage")
+        verbose_name_plural = _("API access usage")
+
+    def __str__(self):
+        return "{} - {} - {}".format(self.api_access_id, self.period_start, self.scope)
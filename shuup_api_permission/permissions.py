@@ -1,13 +1,32 @@
 # -*- coding: utf-8 -*-
-from rest_framework import permissions
-from rest_jwt_permission.settings import get_imported_setting
+from django.conf import settings
+from django.utils.translation import ugettext as _
+from rest_framework import exceptions, permissions
 from rest_jwt_permission.utils import get_role_for, get_view_role
-from shuup.core import cache
 
-from shuup_api_permission.models import APIAccess
-from shuup_api_permission.utils import get_jwt_from_request, get_jwt_payload
+from shuup_api_permission.access_cache import reload_api_access_record
+from shuup_api_permission.concurrency import concurrency_limiter
+from shuup_api_permission.context import get_auth_context
+from shuup_api_permission.instrumentation import instrumented
+from shuup_api_permission.revocation import revocation_list
+from shuup_api_permission.utils import PERMISSION_VERSION_KEY
 
-API_ACCESS_CACHE_KEY_FMT = "api_access_{key}"
+# required scopes indexed by (view class, action, method)
+_view_scopes = {}
+
+
+def get_view_scope(view, method):
+    """
+    Returns the scope required to call the view with the given method
+
+    Resolved once for each view class, action and method.
+    """
+    action = getattr(view, "action", None)
+    key = (view.__class__, action, method)
+    scope = _view_scopes.get(key)
+    if scope is None:
+        scope = _view_scopes[key] = get_view_role(view, get_role_for(method.lower(), action))
+    return scope
 
 
 class APIAccessPermission(permissions.BasePermission):
@@ -15,26 +34,41 @@ class APIAccessPermission(permissions.BasePermission):
     Make sure each request contains a valid JWT with a valid API Key
     """
 
+    @instrumented("api_access_permission")
     def has_permission(self, request, view):
-        payload = getattr(request, "jwt_payload", None)
-        if not payload:
-            payload = get_jwt_payload(get_jwt_from_request(request))
+        context = get_auth_context(request)
+        payload = context.payload
 
-        api_key = payload.get("api_key")
-        if not api_key:
-            return False
+        with context.timing("api_key"):
+            api_access = context.api_access
+            if not api_access or not api_access.enabled:
+                return False
 
-        api_access_cache_key = API_ACCESS_CACHE_KEY_FMT.format(key=api_key)
-        api_access = cache.get(api_access_cache_key)
+            jti = payload.get("jti")
+            if jti and revocation_list.is_revoked(jti):
+                raise exceptions.PermissionDenied(_("The token has been revoked."))
 
-        if not api_access:
-            try:
-                api_access = APIAccess.objects.get(key=api_key)
-                cache.set(api_access_cache_key, api_access)
-            except APIAccess.DoesNotExist:
-                return False
+            token_version = payload.get(PERMISSION_VERSION_KEY)
+            if token_version is not None and token_version > api_access.permission_version:
+                # the token may have been issued after a change the cached record doesn't reflect yet
+                api_access = context.api_access = reload_api_access_record(api_access.key)
+                if not api_access or not api_access.enabled:
+                    return False
+
+            # the permissions of the API access changed after the token was issued
+            if token_version is not None and token_version != api_access.permission_version:
+                if settings.SHUUP_API_REJECT_OUTDATED_TOKENS:
+                    raise exceptions.PermissionDenied(_("The token permissions are outdated, refresh it."))
+                getattr(request, "_request", request).api_token_outdated = True
+
+            if api_access.max_concurrent_requests and context.concurrency_lease is None:
+                context.concurrency_lease = concurrency_limiter.acquire(
+                    api_access.key, api_access.max_concurrent_requests
+                )
+                if context.concurrency_lease is None:
+                    raise exceptions.Throttled(wait=settings.SHUUP_API_CONCURRENCY_RETRY_AFTER)
 
-        return api_access.enabled
+        return True
 
 
 class APIScopePermission(permissions.BasePermission):
@@ -43,16 +77,13 @@ class APIScopePermission(permissions.BasePermission):
     Based on rest_jwt_permission.permissions.JWTAPIPermission
     """
 
+    @instrumented("scope_permission")
     def has_permission(self, request, view):
-        payload = getattr(request, "jwt_payload", None)
-        if not payload:
-            payload = get_jwt_payload(get_jwt_from_request(request))
+        context = get_auth_context(request)
 
-        if not payload:
+        if not context.payload:
             return False
 
-        get_scopes_from_payload = get_imported_setting("GET_SCOPES_FROM_PAYLOAD_HANDLER")
-        payload_scopes = get_scopes_from_payload(payload)
-        role = get_role_for(request.method.lower(), getattr(view, "action", None))
-        scope = get_view_role(view, role)
-        return scope in payload_scopes
+        with context.timing("scope"):
+            context.scope = get_view_scope(view, request.method)
+            return context.scope in context.scopes
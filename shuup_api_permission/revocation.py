@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import hashlib
+import struct
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+
+from shuup_api_permission.local_cache import LocalCache
+from shuup_api_permission.models import RevokedToken
+
+# whether the tokens matched by the bloom filter are revoked, as confirmed
+# against the database, indexed by `jti`
+revoked_tokens_cache = LocalCache("SHUUP_API_REVOCATION_CACHE_SIZE")
+
+
+def _get_timeout(expires_at):
+    if expires_at is None:
+        return None
+    return (expires_at - timezone.now()).total_seconds()
+
+
+class BloomFilter(object):
+    """
+    Probabilistic set: membership tests may return false positives but never false negatives
+    """
+
+    def __init__(self, size, hash_count):
+        self.size = size
+        self.hash_count = hash_count
+        self._bits = bytearray((size + 7) // 8)
+
+    def _get_positions(self, value):
+        # double hashing: derive all the positions from two 64 bits hashes
+        first, second = struct.unpack(str(">QQ"), hashlib.sha256(force_bytes(value)).digest()[:16])
+        return [(first + index * second) % self.size for index in range(self.hash_count)]
+
+    def add(self, value):
+        for position in self._get_positions(value):
+            self._bits[position // 8] |= 1 << (position % 8)
+
+    def __contains__(self, value):
+        return all(self._bits[position // 8] & (1 << (position % 8)) for position in self._get_positions(value))
+
+
+class RevocationList(object):
+    """
+    The revoked tokens, fronted by an in-process bloom filter
+
+    The filter is rebuilt from the database every `SHUUP_API_REVOCATION_SYNC_INTERVAL`
+    seconds by a single thread, the other ones keep using the previous filter meanwhile,
+    thus checking a token which is not revoked costs no I/O most of the time. Possible
+    matches are confirmed against the database once, then remembered until the token
+    expires, or until the next sync for the false positives.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._filter = None
+        self._synced_at = 0
+
+    def _get_active_revoked_tokens(self):
+        return RevokedToken.objects.filter(Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now()))
+
+    def sync(self):
+        bloom_filter = BloomFilter(settings.SHUUP_API_REVOCATION_FILTER_SIZE, settings.SHUUP_API_REVOCATION_HASH_COUNT)
+        for jti in self._get_active_revoked_tokens().values_list("jti", flat=True).iterator():
+            bloom_filter.add(jti)
+
+        with self._lock:
+            self._filter = bloom_filter
+            self._synced_at = time.time()
+        return bloom_filter
+
+    def clear(self):
+        with self._lock:
+            self._filter = None
+            self._synced_at = 0
+        revoked_tokens_cache.clear()
+
+    def _get_filter(self):
+        bloom_filter = self._filter
+        if bloom_filter is not None and time.time() - self._synced_at <= settings.SHUUP_API_REVOCATION_SYNC_INTERVAL:
+            return bloom_filter
+
+        # only wait for the thread rebuilding the filter when there is no filter yet
+        if not self._sync_lock.acquire(bloom_filter is None):
+            return bloom_filter
+        try:
+            if self._filter is not bloom_filter:
+                # rebuilt by another thread meanwhile
+                return self._filter
+            return self.sync()
+        finally:
+            self._sync_lock.release()
+
+    def is_revoked(self, jti):
+        if jti not in self._get_filter():
+            return False
+
+        revoked = revoked_tokens_cache.get(jti)
+        if revoked is not None:
+            return revoked
+
+        expires_at = list(self._get_active_revoked_tokens().filter(jti=jti).values_list("expires_at", flat=True))
+        if expires_at:
+            revoked_tokens_cache.set(jti, True, timeout=_get_timeout(expires_at[0]))
+            return True
+
+        # a false positive of the filter, checked again after the next sync as the token
+        # may be revoked by another process meanwhile, which the filter can't tell
+        revoked_tokens_cache.set(jti, False, timeout=settings.SHUUP_API_REVOCATION_SYNC_INTERVAL)
+        return False
+
+    def revoke(self, jti, expiration=None):
+        """
+        Revoke the token with the given identifier
+
+        :param expiration: the token `exp` claim, revoked tokens are
+            forgotten once they are expired
+        """
+        expires_at = None
+        if expiration:
+            if settings.USE_TZ:
+                expires_at = datetime.fromtimestamp(expiration, timezone.utc)
+            else:
+                expires_at = datetime.fromtimestamp(expiration)
+
+        RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+        RevokedToken.objects.get_or_create(jti=jti, defaults={"expires_at": expires_at})
+
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(jti)
+        revoked_tokens_cache.set(jti, True, timeout=_get_timeout(expires_at))
+
+
+revocation_list = RevocationList()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import base64
+import binascii
+import threading
+
+from shuup_api_permission.models import APIPermissionScope
+
+# payload claim holding the compact scopes
+COMPACT_SCOPES_KEY = "scope_bits"
+
+
+class ScopeCatalogue(object):
+    """
+    Encode sets of scope identifiers as bitsets and back
+
+    Each scope is represented by the bit at the position of its
+    `APIPermissionScope` primary key. Primary keys are never reused,
+    so a bitset stays valid while new scopes are created. The catalogue
+    is reloaded from the database whenever it meets an unknown scope.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._identifiers = None
+        self._ids = None
+
+    def load(self):
+        with self._lock:
+            scopes = list(APIPermissionScope.objects.values_list("pk", "identifier"))
+            self._identifiers = dict(scopes)
+            self._ids = dict((identifier, pk) for pk, identifier in scopes)
+
+    def clear(self):
+        with self._lock:
+            self._identifiers = None
+            self._ids = None
+
+    def encode(self, identifiers):
+        """
+        Returns the URL-safe base64 representation of the bitset of the given scope identifiers
+        """
+        if self._ids is None or any(identifier not in self._ids for identifier in identifiers):
+            self.load()
+
+        ids = self._ids
+        bits = 0
+        for identifier in identifiers:
+            if identifier in ids:
+                bits |= 1 << ids[identifier]
+
+        hex_bits = "%x" % bits
+        if len(hex_bits) % 2:
+            hex_bits = "0" + hex_bits
+        return base64.urlsafe_b64encode(binascii.unhexlify(hex_bits)).rstrip(b"=").decode("ascii")
+
+    def decode(self, value):
+        """
+        Returns the frozenset of scope identifiers of the given encoded bitset
+        """
+        if not value:
+            return frozenset()
+
+        value = value.encode("ascii") if not isinstance(value, bytes) else value
+        raw = base64.urlsafe_b64decode(value + b"=" * (-len(value) % 4))
+        bits = int(binascii.hexlify(raw), 16) if raw else 0
+
+        ids = [position for position, bit in enumerate(reversed(bin(bits)[2:])) if bit == "1"]
+
+        if self._identifiers is None or any(pk not in self._identifiers for pk in ids):
+            self.load()
+
+        identifiers = self._identifiers
+        return frozenset(identifiers[pk] for pk in ids if pk in identifiers)
+
+
+scope_catalogue = ScopeCatalogue()
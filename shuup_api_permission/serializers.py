@@ -3,7 +3,7 @@ from calendar import timegm
 from datetime import datetime, timedelta
 
 import jwt
-from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
 from django.utils.translation import ugettext as _
 from rest_framework import serializers
@@ -12,13 +12,26 @@ from rest_framework_jwt.compat import (
 )
 from rest_framework_jwt.settings import api_settings
 
+from shuup_api_permission.access_cache import get_api_access_record
+from shuup_api_permission.anonymous import (
+    get_reusable_anonymous_token, store_anonymous_token
+)
+from shuup_api_permission.credentials import authenticate_credentials
+from shuup_api_permission.hashing import check_secret
 from shuup_api_permission.models import APIAccess
+from shuup_api_permission.revocation import revocation_list
+from shuup_api_permission.user_cache import resolve_user
+from shuup_api_permission.utils import (
+    get_current_permission_fingerprint, jwt_refresh_payload_handler,
+    PERMISSION_FINGERPRINT_KEY
+)
 
 User = get_user_model()
 jwt_payload_handler = api_settings.JWT_PAYLOAD_HANDLER
 jwt_encode_handler = api_settings.JWT_ENCODE_HANDLER
 jwt_decode_handler = api_settings.JWT_DECODE_HANDLER
 jwt_get_username_from_payload = api_settings.JWT_PAYLOAD_GET_USERNAME_HANDLER
+jwt_get_user_id_from_payload = api_settings.JWT_PAYLOAD_GET_USER_ID_HANDLER
 
 
 class JSONWebTokenSerializer(Serializer):
@@ -47,13 +60,23 @@ class JSONWebTokenSerializer(Serializer):
     def validate(self, attrs):
         api_key = attrs['api_key']
         api_secret = attrs['api_secret']
+        username = attrs.get(self.username_field)
+        shop = self.context["request"].shop
 
-        try:
-            api_access = APIAccess.objects.get(key=api_key, secret=api_secret)
-        except APIAccess.DoesNotExist:
+        if not username:
+            token = get_reusable_anonymous_token(api_key, api_secret, shop)
+            if token:
+                return {
+                    'token': token,
+                    'user': AnonymousUser()
+                }
+
+        # only the digest of the secret is cached, revalidated against the shared cache
+        # so a secret reset in another process takes effect right away
+        api_access = get_api_access_record(api_key, revalidate=True)
+        if not api_access or not check_secret(api_secret, api_access.secret):
             raise serializers.ValidationError(_("Invalid API key or secret."))
 
-        username = attrs.get(self.username_field)
         user = AnonymousUser()
 
         if username:
@@ -63,7 +86,7 @@ class JSONWebTokenSerializer(Serializer):
             }
 
             if all(credentials.values()):
-                user = authenticate(**credentials)
+                user = authenticate_credentials(self.username_field, username, credentials['password'])
                 if user:
                     if not user.is_active:
                         raise serializers.ValidationError(_('User account is disabled.'))
@@ -74,10 +97,13 @@ class JSONWebTokenSerializer(Serializer):
                 msg = msg.format(username_field=self.username_field)
                 raise serializers.ValidationError(msg)
 
-        payload = jwt_payload_handler(user, api_access=api_access, shop=self.context["request"].shop)
+        payload = jwt_payload_handler(user, api_access=api_access, shop=shop)
+        token = jwt_encode_handler(payload)
+        if not username:
+            store_anonymous_token(api_key, api_secret, shop, token, payload["jti"])
 
         return {
-            'token': jwt_encode_handler(payload),
+            'token': token,
             'user': user
         }
 
@@ -101,6 +127,10 @@ class VerificationBaseSerializer(Serializer):
         except jwt.DecodeError:
             raise serializers.ValidationError(_('Error decoding signature.'))
 
+        jti = payload.get("jti")
+        if jti and revocation_list.is_revoked(jti):
+            raise serializers.ValidationError(_('The token has been revoked.'))
+
         return payload
 
     def _check_user(self, payload):
@@ -111,7 +141,7 @@ class VerificationBaseSerializer(Serializer):
 
         # Make sure user exists
         try:
-            user = User.objects.get_by_natural_key(username)
+            user = resolve_user(username, jwt_get_user_id_from_payload(payload))
         except User.DoesNotExist:
             raise serializers.ValidationError(_("User doesn't exist."))
 
@@ -151,9 +181,8 @@ class RefreshJSONWebTokenSerializer(VerificationBaseSerializer):
         # Get and check 'orig_iat'
         orig_iat = payload.get('orig_iat')
 
-        try:
-            api_access = APIAccess.objects.get(key=payload["api_key"])
-        except APIAccess.DoesNotExist:
+        api_access = get_api_access_record(payload["api_key"])
+        if not api_access:
             raise serializers.ValidationError(_("Invalid API key."))
 
         if orig_iat:
@@ -172,10 +201,39 @@ class RefreshJSONWebTokenSerializer(VerificationBaseSerializer):
         else:
             raise serializers.ValidationError(_('orig_iat field is required.'))
 
-        new_payload = jwt_payload_handler(user, api_access=api_access, shop=self.context["request"].shop)
+        shop = self.context["request"].shop
+        # the scopes are only computed again when the permissions may have changed
+        fingerprint = get_current_permission_fingerprint(api_access, user.pk)
+        if payload.get(PERMISSION_FINGERPRINT_KEY) == fingerprint:
+            new_payload = jwt_refresh_payload_handler(user, payload, shop)
+        else:
+            try:
+                api_access = APIAccess.objects.get(key=api_access.key)
+            except APIAccess.DoesNotExist:
+                raise serializers.ValidationError(_("Invalid API key."))
+            new_payload = jwt_payload_handler(user, api_access=api_access, shop=shop)
         new_payload['orig_iat'] = orig_iat
 
         return {
             'token': jwt_encode_handler(new_payload),
             'user': user
         }
+
+
+class RevokeJSONWebTokenSerializer(VerificationBaseSerializer):
+    """
+    Revoke an access token.
+    """
+
+    def validate(self, attrs):
+        token = attrs['token']
+        payload = self._check_payload(token=token)
+
+        jti = payload.get('jti')
+        if not jti:
+            raise serializers.ValidationError(_('The token can not be revoked.'))
+
+        revocation_list.revoke(jti, payload.get('exp'))
+        return {
+            'token': token
+        }
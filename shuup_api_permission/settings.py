@@ -2,3 +2,139 @@
 
 # The URL used to acquire the JWT Token. Default: "auth"
 SHUUP_API_AUTH_URL = "auth"
+
+# The maximum number of decoded JWT payloads kept in memory by each process.
+# Entries also expire together with the token (`exp` claim). Default: 10000
+SHUUP_API_JWT_CACHE_SIZE = 10000
+
+# The maximum number of API access records kept in memory by each process. Default: 1000
+SHUUP_API_ACCESS_LOCAL_CACHE_SIZE = 1000
+
+# For how many seconds an API access record kept in memory is trusted before being
+# revalidated against the shared cache. This is the maximum delay for changes made
+# to an API access in a process to take effect in the other ones. Default: 5
+SHUUP_API_ACCESS_LOCAL_CACHE_TIMEOUT = 5
+
+# The maximum number of unknown API keys remembered by each process. Default: 1000
+SHUUP_API_ACCESS_NEGATIVE_CACHE_SIZE = 1000
+
+# For how many seconds an unknown API key is remembered, avoiding
+# database lookups for requests made with the same key. Default: 30
+SHUUP_API_ACCESS_NEGATIVE_CACHE_TIMEOUT = 30
+
+# Whether the users authenticated through the API should be cached in memory,
+# saving a database query on each request. The full user is only fetched
+# when a field other than `pk`, `id` or `is_active` is used. Default: False
+SHUUP_API_USER_CACHE_ENABLED = False
+
+# The maximum number of users kept in memory by each process. Default: 10000
+SHUUP_API_USER_CACHE_SIZE = 10000
+
+# For how many seconds a cached user is trusted. Users changed in the current process
+# are invalidated right away, this limits the delay for the other processes. Default: 60
+SHUUP_API_USER_CACHE_TIMEOUT = 60
+
+# Whether the scopes should be encoded as a compact bitset in the JWT instead of a list
+# of identifiers. This shrinks tokens of API keys with many permissions. Default: False
+SHUUP_API_JWT_COMPACT_SCOPES = False
+
+# Whether requests made with tokens issued before a change in the API access permissions
+# should be rejected. When False, the responses of such requests contain the
+# `X-API-Token-Outdated: true` header, telling clients to refresh the token. Default: True
+SHUUP_API_REJECT_OUTDATED_TOKENS = True
+
+# How often, in seconds, each process reloads the list of revoked tokens. Tokens revoked
+# by other processes may still be accepted during this interval. Default: 30
+SHUUP_API_REVOCATION_SYNC_INTERVAL = 30
+
+# The number of bits and hash functions of the bloom filter used to check revoked tokens
+# in memory. The defaults keep false positives around 1% for up to 100000 revoked tokens.
+SHUUP_API_REVOCATION_FILTER_SIZE = 2 ** 20
+SHUUP_API_REVOCATION_HASH_COUNT = 7
+
+# The maximum number of tokens matched by the bloom filter, revoked or not, remembered by
+# each process, so that requests made with them don't query the database. Default: 10000
+SHUUP_API_REVOCATION_CACHE_SIZE = 10000
+
+# The URL prefixes handled by `ShuupAPIPermissionMiddleware`, e.g. ["/api/"]. The
+# middleware ignores requests to other URLs. Default: None, handle all requests
+SHUUP_API_PERMISSION_URL_PREFIXES = None
+
+# How often, in seconds, each process reconciles the requests counted by its rate limits
+# with the other processes through the cache. Requests made to other processes are
+# only taken into account after this interval. Default: 1
+SHUUP_API_RATE_LIMIT_SYNC_INTERVAL = 1
+
+# The maximum number of rate limited API keys and users tracked by each process. Default: 10000
+SHUUP_API_RATE_LIMIT_CACHE_SIZE = 10000
+
+# For how many seconds a request is counted by the concurrency limit of its API access
+# when the worker handling it doesn't release it, e.g. because it crashed. Requests
+# lasting longer than twice this time may not be counted anymore. Default: 60
+SHUUP_API_CONCURRENCY_LEASE_TIMEOUT = 60
+
+# The `Retry-After` value, in seconds, of the responses to requests rejected by
+# the concurrency limit of the API access. Default: 1
+SHUUP_API_CONCURRENCY_RETRY_AFTER = 1
+
+# Whether the number of requests, their duration and status of each API access should be
+# recorded. Each process aggregates the requests in memory and saves them in batches,
+# see `SHUUP_API_METERING_FLUSH_INTERVAL` and `SHUUP_API_METERING_FLUSH_SIZE`. Default: False
+SHUUP_API_METERING_ENABLED = False
+
+# How often, in seconds, each process saves the recorded usage. Default: 60
+SHUUP_API_METERING_FLUSH_INTERVAL = 60
+
+# The number of distinct (API key, scope, status class) counters kept in memory
+# by each process before saving them, regardless of the interval. Default: 1000
+SHUUP_API_METERING_FLUSH_SIZE = 1000
+
+# Whether the duration of the JWT decode, authentication and permission checks should be
+# measured. When disabled, the instrumentation only costs reading this setting. Default: False
+SHUUP_API_INSTRUMENTATION_ENABLED = False
+
+# The class receiving the measures, a subclass of `BaseCollector`.
+# Default: "shuup_api_permission.instrumentation.InMemoryCollector"
+SHUUP_API_INSTRUMENTATION_COLLECTOR = "shuup_api_permission.instrumentation.InMemoryCollector"
+
+# Whether the responses should contain the `Server-Timing` header with the time spent
+# in each authentication stage: token, decode, api_key, user and scope. It can also be
+# enabled for some API accesses only, through their `server_timing` flag. Default: False
+SHUUP_API_SERVER_TIMING_ENABLED = False
+
+# The maximum number of anonymous scope sets and reusable anonymous tokens
+# kept in memory by each process. Default: 1000
+SHUUP_API_ANONYMOUS_CACHE_SIZE = 1000
+
+# For how many seconds an anonymous token can be returned again to requests made
+# with the same API key, secret and shop, saving the database lookups and the signature.
+# Keep it well below `JWT_EXPIRATION_DELTA`, as the reused tokens expire at the same
+# time and revoking one revokes it for every client. Default: 0, never reuse tokens
+SHUUP_API_ANONYMOUS_TOKEN_REUSE_TIMEOUT = 0
+
+# The key of the HMAC-SHA256 digests stored instead of the API secrets. Changing it
+# invalidates every API secret, so set it explicitly to be able to rotate `SECRET_KEY`.
+# Default: None, use `SECRET_KEY`
+SHUUP_API_SECRET_PEPPER = None
+
+# The number of threads verifying the username and password of token requests.
+# Password hashers are slow on purpose, the pool bounds how many verifications run
+# at the same time. Requires the `futures` package on Python 2. Default: 0, verify
+# the credentials in the request thread
+SHUUP_API_AUTH_POOL_SIZE = 0
+
+# The maximum number of credential verifications waiting for a free thread of the pool.
+# Token requests are rejected with a 429 response when the queue is full. Default: 100
+SHUUP_API_AUTH_QUEUE_SIZE = 100
+
+# The number of seconds clients are asked to wait (`Retry-After`)
+# when the credentials verification queue is full. Default: 1
+SHUUP_API_AUTH_RETRY_AFTER = 1
+
+# For how many seconds verified credentials are remembered by each process, so repeated
+# token requests with the same username and password skip the password hasher. Only a
+# digest of the credentials is kept, changing the password invalidates it. Default: 0, disabled
+SHUUP_API_CREDENTIALS_CACHE_TIMEOUT = 0
+
+# The maximum number of verified credentials remembered by each process. Default: 1000
+SHUUP_API_CREDENTIALS_CACHE_SIZE = 1000
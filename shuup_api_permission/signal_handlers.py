@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db.models import F
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete
+)
+from django.dispatch import receiver
+
+from shuup_api_permission.access_cache import invalidate_api_access_record
+from shuup_api_permission.group_scopes import (
+    get_api_access_ids, rebuild_api_access_group_scopes
+)
+from shuup_api_permission.models import (
+    APIAccess, APIPermissionGroups, APIPermissionScope
+)
+from shuup_api_permission.user_cache import (
+    invalidate_user_snapshot, user_groups_cache
+)
+
+
+@receiver(post_save, sender=get_user_model(), dispatch_uid="shuup_api_permission:invalidate_user_on_save")
+@receiver(post_delete, sender=get_user_model(), dispatch_uid="shuup_api_permission:invalidate_user_on_delete")
+def handle_user_change(sender, instance, **kwargs):
+    invalidate_user_snapshot(instance)
+
+
+@receiver(m2m_changed, sender=get_user_model().groups.through,
+          dispatch_uid="shuup_api_permission:user_groups_changed")
+def handle_user_groups_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        user_groups_cache.delete(instance.pk)
+    elif pk_set:
+        for user_id in pk_set:
+            user_groups_cache.delete(user_id)
+    else:
+        user_groups_cache.clear()
+
+
+def _permissions_changed(api_access_ids, rebuild_group_scopes=True, instance=None):
+    """
+    Bump the permission version of the given API accesses,
+    keeping the group scopes and cached records up to date
+
+    :param instance: an `APIAccess` whose in-memory version is updated too
+    """
+    api_access_ids = set(api_access_ids)
+    if not api_access_ids:
+        return
+
+    if rebuild_group_scopes:
+        rebuild_api_access_group_scopes(api_access_ids)
+
+    api_accesses = APIAccess.objects.filter(pk__in=api_access_ids)
+    api_accesses.update(permission_version=F("permission_version") + 1)
+    for pk, api_key, permission_version in api_accesses.values_list("pk", "key", "permission_version"):
+        invalidate_api_access_record(api_key)
+        if isinstance(instance, APIAccess) and instance.pk == pk:
+            instance.permission_version = permission_version
+
+
+def _handle_m2m_change(instance, action, get_affected_ids, **kwargs):
+    """
+    The affected objects are collected before the change, while
+    the relations still exist, and updated after it
+
+    :param get_affected_ids: returns the affected API access ids
+    """
+    if action.startswith("pre_"):
+        instance._api_permissions_affected_ids = get_affected_ids()
+    elif action.startswith("post_"):
+        api_access_ids = getattr(instance, "_api_permissions_affected_ids", [])
+        _permissions_changed(api_access_ids, instance=instance, **kwargs)
+
+
+@receiver(m2m_changed, sender=APIAccess.permissions_groups.through,
+          dispatch_uid="shuup_api_permission:api_access_permissions_groups_changed")
+def handle_api_access_permissions_groups_change(sender, instance, action, reverse, pk_set, **kwargs):
+    def get_affected_ids():
+        if reverse:
+            # instance is an APIPermissionGroups and pk_set contains APIAccess ids (None when clearing)
+            return pk_set or get_api_access_ids(permissions_groups=instance.pk)
+        return [instance.pk]
+
+    _handle_m2m_change(instance, action, get_affected_ids)
+
+
+@receiver(m2m_changed, sender=APIAccess.anonymous_permissions.through,
+          dispatch_uid="shuup_api_permission:api_access_anonymous_permissions_changed")
+def handle_api_access_anonymous_permissions_change(sender, instance, action, reverse, pk_set, **kwargs):
+    def get_affected_ids():
+        if reverse:
+            # instance is an APIPermissionScope and pk_set contains APIAccess ids (None when clearing)
+            return pk_set or get_api_access_ids(anonymous_permissions=instance.pk)
+        return [instance.pk]
+
+    _handle_m2m_change(instance, action, get_affected_ids, rebuild_group_scopes=False)
+
+
+@receiver(m2m_changed, sender=APIPermissionGroups.groups.through,
+          dispatch_uid="shuup_api_permission:api_permission_groups_groups_changed")
+@receiver(m2m_changed, sender=APIPermissionGroups.permissions.through,
+          dispatch_uid="shuup_api_permission:api_permission_groups_permissions_changed")
+def handle_api_permission_groups_change(sender, instance, action, reverse, pk_set, **kwargs):
+    def get_affected_ids():
+        if reverse:
+            # instance is either a Group or an APIPermissionScope and
+            # pk_set contains APIPermissionGroups ids (None when clearing)
+            field_name = "groups" if sender == APIPermissionGroups.groups.through else "permissions"
+            permission_group_ids = list(
+                pk_set or
+                APIPermissionGroups.objects.filter(**{field_name: instance.pk}).values_list("pk", flat=True)
+            )
+        else:
+            permission_group_ids = [instance.pk]
+        return get_api_access_ids(permissions_groups__in=permission_group_ids)
+
+    _handle_m2m_change(instance, action, get_affected_ids)
+
+
+@receiver(pre_delete, sender=APIPermissionGroups, dispatch_uid="shuup_api_permission:api_permission_groups_pre_delete")
+def handle_api_permission_groups_pre_delete(sender, instance, **kwargs):
+    instance._api_permissions_affected_ids = get_api_access_ids(permissions_groups=instance.pk)
+
+
+@receiver(pre_delete, sender=APIPermissionScope, dispatch_uid="shuup_api_permission:api_permission_scope_pre_delete")
+def handle_api_permission_scope_pre_delete(sender, instance, **kwargs):
+    api_access_ids = set(get_api_access_ids(permissions_groups__permissions=instance.pk))
+    api_access_ids.update(get_api_access_ids(anonymous_permissions=instance.pk))
+    instance._api_permissions_affected_ids = api_access_ids
+
+
+@receiver(pre_delete, sender=Group, dispatch_uid="shuup_api_permission:group_pre_delete")
+def handle_group_pre_delete(sender, instance, **kwargs):
+    # the group scopes and group memberships are deleted in cascade, without m2m signals
+    instance._api_permissions_affected_ids = get_api_access_ids(permissions_groups__groups=instance.pk)
+    user_groups_cache.clear()
+
+
+@receiver(post_delete, sender=Group, dispatch_uid="shuup_api_permission:group_deleted")
+@receiver(post_delete, sender=APIPermissionGroups, dispatch_uid="shuup_api_permission:api_permission_groups_deleted")
+@receiver(post_delete, sender=APIPermissionScope, dispatch_uid="shuup_api_permission:api_permission_scope_deleted")
+def handle_api_permission_deleted(sender, instance, **kwargs):
+    _permissions_changed(getattr(instance, "_api_permissions_affected_ids", []))
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+from shuup_api_permission.context import get_auth_context
+from shuup_api_permission.counter_cache import cache
+from shuup_api_permission.local_cache import LocalCache
+
+# the rate limits of API accesses are expressed in requests per minute
+RATE_LIMIT_PERIOD = 60
+
+RATE_LIMIT_CACHE_KEY_FMT = "api_rate_limit:{key}:{window}"
+
+
+class TokenBucket(object):
+    """
+    In-process token bucket refilled with `limit` tokens every `RATE_LIMIT_PERIOD` seconds
+
+    Every `SHUUP_API_RATE_LIMIT_SYNC_INTERVAL` seconds the tokens consumed by the process
+    are added to a counter in the shared cache, and the tokens consumed by all the
+    processes during the current period are taken out of the bucket.
+    """
+
+    def __init__(self, key, limit):
+        self.key = key
+        self.limit = limit
+        self.tokens = float(limit)
+        self.updated_at = self.synced_at = time.time()
+        # tokens consumed since the last synchronization
+        self.pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self):
+        return float(self.limit) / RATE_LIMIT_PERIOD
+
+    def consume(self):
+        """
+        Take a token from the bucket
+
+        :return: 0 when a token was available, otherwise the number
+            of seconds until the next token is available
+        :rtype: float
+        """
+        with self._lock:
+            now = time.time()
+            self.tokens = min(self.limit, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+
+            if now - self.synced_at >= settings.SHUUP_API_RATE_LIMIT_SYNC_INTERVAL:
+                self._sync(now)
+
+            if self.tokens < 1:
+                return (1 - self.tokens) / self.rate
+
+            self.tokens -= 1
+            self.pending += 1
+            return 0
+
+    def _sync(self, now):
+        cache_key = RATE_LIMIT_CACHE_KEY_FMT.format(key=self.key, window=int(now // RATE_LIMIT_PERIOD))
+        cache.add(cache_key, 0, RATE_LIMIT_PERIOD * 2)
+        try:
+            used = cache.incr(cache_key, self.pending) if self.pending else cache.get(cache_key, default=0)
+        except ValueError:
+            # the counter was evicted right after being added
+            cache.set(cache_key, self.pending, RATE_LIMIT_PERIOD * 2)
+            used = self.pending
+
+        self.pending = 0
+        self.synced_at = now
+        self.tokens = min(self.tokens, max(self.limit - used, 0))
+
+
+# `TokenBucket` instances indexed by the rate limited key
+token_buckets = LocalCache("SHUUP_API_RATE_LIMIT_CACHE_SIZE")
+
+
+def get_token_bucket(key, limit):
+    bucket = token_buckets.get(key)
+    if bucket is None or bucket.limit != limit:
+        bucket = TokenBucket(key, limit)
+        token_buckets.set(key, bucket)
+    return bucket
+
+
+class APIAccessRateThrottle(BaseThrottle):
+    """
+    Limit the requests made with each API access, and by each user of an API access,
+    according to `APIAccess.rate_limit` and `APIAccess.user_rate_limit`
+    """
+
+    def __init__(self):
+        self.wait_time = None
+
+    def allow_request(self, request, view):
+        context = get_auth_context(request)
+        if not context.jwt_value:
+            return True
+
+        api_access = context.api_access
+        if not api_access:
+            return True
+
+        limits = []
+        user = context.user
+        if api_access.user_rate_limit and user is not None and user.pk:
+            limits.append(("{}_{}".format(api_access.key, user.pk), api_access.user_rate_limit))
+
+        if api_access.rate_limit:
+            limits.append((api_access.key, api_access.rate_limit))
+
+        for key, limit in limits:
+            wait_time = get_token_bucket(key, limit).consume()
+            if wait_time:
+                self.wait_time = wait_time
+                return False
+
+        return True
+
+    def wait(self):
+        return self.wait_time
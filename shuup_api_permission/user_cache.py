@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.functional import SimpleLazyObject
+
+from shuup_api_permission.local_cache import LocalCache
+
+# The minimum needed to authenticate a request without loading the user
+UserSnapshot = namedtuple("UserSnapshot", ["pk", "username", "is_active"])
+
+# snapshots indexed by ("id", user id) or ("username", username)
+user_snapshot_cache = LocalCache("SHUUP_API_USER_CACHE_SIZE")
+
+# frozensets of group ids indexed by user id
+user_groups_cache = LocalCache("SHUUP_API_USER_CACHE_SIZE")
+
+
+class LazyUser(SimpleLazyObject):
+    """
+    User proxy built from a `UserSnapshot`
+
+    `pk`, `id` and `is_active` are answered by the snapshot,
+    the user is only fetched from the database when
+    anything else is accessed.
+    """
+
+    def __init__(self, snapshot):
+        self.__dict__["_snapshot"] = snapshot
+        super(LazyUser, self).__init__(lambda: get_user_model().objects.get(pk=snapshot.pk))
+
+    @property
+    def pk(self):
+        return self._snapshot.pk
+
+    @property
+    def id(self):
+        return self._snapshot.pk
+
+    @property
+    def is_active(self):
+        return self._snapshot.is_active
+
+
+def _get_cache_key(user_id, username):
+    return ("id", user_id) if user_id else ("username", username)
+
+
+def resolve_user(username, user_id=None):
+    """
+    Returns the user with the given username
+
+    When `SHUUP_API_USER_CACHE_ENABLED` is set, a `LazyUser` is returned
+    for users resolved recently, avoiding any database query.
+
+    :raises: `DoesNotExist` when there is no such user
+    """
+    if not settings.SHUUP_API_USER_CACHE_ENABLED:
+        return get_user_model().objects.get_by_natural_key(username)
+
+    cache_key = _get_cache_key(user_id, username)
+    snapshot = user_snapshot_cache.get(cache_key)
+    if snapshot and snapshot.username == username:
+        return LazyUser(snapshot)
+
+    user = get_user_model().objects.get_by_natural_key(username)
+    if not user_id or user.pk == user_id:
+        snapshot = UserSnapshot(user.pk, user.get_username(), user.is_active)
+        user_snapshot_cache.set(cache_key, snapshot, timeout=settings.SHUUP_API_USER_CACHE_TIMEOUT)
+    return user
+
+
+def get_user_group_ids(user_id):
+    """
+    Returns the frozenset of ids of the groups of the user
+
+    Cached like the user snapshots when `SHUUP_API_USER_CACHE_ENABLED` is set.
+    """
+    group_ids = user_groups_cache.get(user_id) if settings.SHUUP_API_USER_CACHE_ENABLED else None
+    if group_ids is None:
+        group_ids = frozenset(
+            group_id
+            for group_id in get_user_model().objects.filter(pk=user_id).values_list("groups", flat=True)
+            if group_id
+        )
+        if settings.SHUUP_API_USER_CACHE_ENABLED:
+            user_groups_cache.set(user_id, group_ids, timeout=settings.SHUUP_API_USER_CACHE_TIMEOUT)
+    return group_ids
+
+
+def invalidate_user_snapshot(user):
+    user_snapshot_cache.delete(_get_cache_key(user.pk, None))
+    user_snapshot_cache.delete(_get_cache_key(None, user.get_username()))
+    user_groups_cache.delete(user.pk)
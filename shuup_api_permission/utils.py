@@ -1,18 +1,42 @@
 # -*- coding: utf-8 -*-
+import hashlib
+import time
+from datetime import timedelta
+from uuid import uuid4
+
 import jwt
-from django.db.models import Q
-from django.utils.encoding import smart_text
-from django.utils.lru_cache import lru_cache
+from django.conf import settings
+from django.utils.encoding import force_bytes, smart_text
 from django.utils.translation import ugettext as _
 from rest_framework import exceptions
 from rest_framework.authentication import get_authorization_header
 from rest_framework_jwt.settings import api_settings
 from rest_framework_jwt.utils import \
     jwt_payload_handler as base_jwt_payload_handler
-from rest_jwt_permission.settings import get_setting
+from rest_jwt_permission.settings import get_imported_setting, get_setting
+
+from shuup_api_permission.anonymous import get_anonymous_scopes
+from shuup_api_permission.group_scopes import (
+    get_api_access_group_ids, get_user_group_scopes
+)
+from shuup_api_permission.instrumentation import instrumented
+from shuup_api_permission.local_cache import LocalCache
+from shuup_api_permission.scope_catalogue import (
+    COMPACT_SCOPES_KEY, scope_catalogue
+)
+from shuup_api_permission.user_cache import get_user_group_ids
 
 jwt_decode_handler = api_settings.JWT_DECODE_HANDLER
 
+# payload claim holding the permission version of the API access when the token was issued
+PERMISSION_VERSION_KEY = "permission_version"
+
+# payload claim identifying the permission version and the groups the scopes were computed from
+PERMISSION_FINGERPRINT_KEY = "permission_fingerprint"
+
+# `DecodedJWT` instances indexed by the raw token
+jwt_payload_cache = LocalCache("SHUUP_API_JWT_CACHE_SIZE")
+
 
 def get_jwt_from_request(request):
     auth = get_authorization_header(request).split()
@@ -36,12 +60,54 @@ def get_jwt_from_request(request):
     return auth[1]
 
 
-@lru_cache()
-def get_jwt_payload(jwt_value):
+def _get_payload_cache_timeout(payload):
+    """
+    Returns for how many seconds the decoded payload can be reused
+    or None if the token never expires
+    """
+    expiration = payload.get("exp")
+    if not expiration or not api_settings.JWT_VERIFY_EXPIRATION:
+        return None
+
+    leeway = api_settings.JWT_LEEWAY
+    if isinstance(leeway, timedelta):
+        leeway = leeway.total_seconds()
+
+    return expiration + leeway - time.time()
+
+
+class DecodedJWT(object):
+    """
+    A decoded token payload together with its scopes, computed on first use
+    """
+    __slots__ = ("payload", "_scopes")
+
+    def __init__(self, payload):
+        self.payload = payload
+        self._scopes = None
+
+    @property
+    def scopes(self):
+        if self._scopes is None:
+            if COMPACT_SCOPES_KEY in self.payload:
+                self._scopes = scope_catalogue.decode(self.payload[COMPACT_SCOPES_KEY])
+            else:
+                get_scopes_from_payload = get_imported_setting("GET_SCOPES_FROM_PAYLOAD_HANDLER")
+                self._scopes = frozenset(get_scopes_from_payload(self.payload) or [])
+        return self._scopes
+
+
+@instrumented("jwt_decode")
+def get_decoded_jwt(jwt_value):
     if not jwt_value:
         raise exceptions.PermissionDenied(_('Missing access token.'))
+
+    decoded_jwt = jwt_payload_cache.get(jwt_value)
+    if decoded_jwt is not None:
+        return decoded_jwt
+
     try:
-        return jwt_decode_handler(jwt_value)
+        payload = jwt_decode_handler(jwt_value)
     except jwt.ExpiredSignature:
         raise exceptions.PermissionDenied(_('Signature has expired.'))
     except jwt.DecodeError:
@@ -49,26 +115,84 @@ def get_jwt_payload(jwt_value):
     except jwt.InvalidTokenError:
         raise exceptions.PermissionDenied()
 
+    decoded_jwt = DecodedJWT(payload)
+    jwt_payload_cache.set(jwt_value, decoded_jwt, timeout=_get_payload_cache_timeout(payload))
+    return decoded_jwt
+
+
+def get_jwt_payload(jwt_value):
+    return get_decoded_jwt(jwt_value).payload
+
+
+def get_jwt_scopes(jwt_value):
+    """
+    Returns the frozenset of scopes of the token
+    """
+    return get_decoded_jwt(jwt_value).scopes
+
+
+def get_permission_fingerprint(permission_version, group_ids):
+    value = "{}:{}".format(permission_version, ",".join(str(group_id) for group_id in sorted(group_ids)))
+    return hashlib.sha256(force_bytes(value)).hexdigest()[:16]
+
+
+def get_current_permission_fingerprint(api_access, user_id):
+    """
+    Returns the fingerprint of the scopes the user, or the anonymous user
+    when `user_id` is None, would get now through the API access
+
+    Only cached values are used once the caches are warm.
+    """
+    group_ids = ()
+    if user_id is not None:
+        group_ids = get_user_group_ids(user_id) & get_api_access_group_ids(api_access, api_access.permission_version)
+    return get_permission_fingerprint(api_access.permission_version, group_ids)
+
 
 def jwt_payload_handler(user, api_access, shop):
     payload = base_jwt_payload_handler(user)
+    # unique token identifier, used to revoke it
+    payload["jti"] = uuid4().hex
+
+    permission_version = api_access.permission_version
 
     if user.is_authenticated():
-        user_groups_filter = Q()
-        for group in user.groups.all():
-            user_groups_filter |= Q(groups=group)
-
-        permissions = list(
-            api_access.permissions_groups
-            .filter(user_groups_filter)
-            .values_list("permissions__identifier", flat=True)
-            .distinct()
-        )
+        group_scopes = get_user_group_scopes(api_access, user)
+        permissions = set()
+        for scopes in group_scopes.values():
+            permissions.update(scopes)
     else:
-        permissions = list(api_access.anonymous_permissions.values_list("identifier", flat=True).distinct())
+        group_scopes = {}
+        permissions = get_anonymous_scopes(api_access, permission_version)
 
     payload["anonymous"] = not user.is_authenticated()
     payload["api_key"] = api_access.key
+    payload[PERMISSION_VERSION_KEY] = permission_version
+    payload[PERMISSION_FINGERPRINT_KEY] = get_permission_fingerprint(permission_version, group_scopes.keys())
     payload["shop"] = shop.id
-    payload[get_setting("JWT_PAYLOAD_SCOPES_KEY")] = [permission for permission in permissions if permission]
+
+    scopes = [permission for permission in sorted(permissions) if permission]
+    if settings.SHUUP_API_JWT_COMPACT_SCOPES:
+        payload[COMPACT_SCOPES_KEY] = scope_catalogue.encode(scopes)
+    else:
+        payload[get_setting("JWT_PAYLOAD_SCOPES_KEY")] = scopes
     return payload
+
+
+def jwt_refresh_payload_handler(user, payload, shop):
+    """
+    Returns a new payload for the user, with the scopes of the given payload
+
+    Used to refresh tokens whose scopes didn't change, without computing them again.
+    The user claims are derived again, as the user may have changed since.
+    """
+    new_payload = base_jwt_payload_handler(user)
+    new_payload["jti"] = uuid4().hex
+
+    for key in ("anonymous", "api_key", PERMISSION_VERSION_KEY, PERMISSION_FINGERPRINT_KEY,
+                COMPACT_SCOPES_KEY, get_setting("JWT_PAYLOAD_SCOPES_KEY")):
+        if key in payload:
+            new_payload[key] = payload[key]
+
+    new_payload["shop"] = shop.id
+    return new_payload
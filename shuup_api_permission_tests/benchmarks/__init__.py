@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals
+
+import json
+import os
+import platform
+import threading
+import timeit
+
+import django
+import pytest
+from django.db import connection
+
+# benchmarks are slow, thus they only run when the environment variable is set
+benchmark = pytest.mark.skipif(
+    not os.environ.get("SHUUP_API_BENCHMARKS"),
+    reason="Set SHUUP_API_BENCHMARKS=1 to run the benchmarks."
+)
+
+# results are also appended to this file, one JSON object per line, when set
+OUTPUT_PATH = os.environ.get("SHUUP_API_BENCHMARKS_OUTPUT")
+
+
+def _summarize(timings):
+    timings.sort()
+    return {
+        "rounds": len(timings),
+        "min": timings[0],
+        "median": timings[len(timings) // 2],
+        "p95": timings[int(len(timings) * 0.95) - 1],
+        "max": timings[-1]
+    }
+
+
+def measure(func, rounds=100):
+    """
+    Call `func` `rounds` times and return the timings in milliseconds
+    """
+    timings = []
+    for _ in range(rounds):
+        start = timeit.default_timer()
+        func()
+        timings.append((timeit.default_timer() - start) * 1000)
+    return _summarize(timings)
+
+
+def measure_concurrent(func, threads=1, rounds=100):
+    """
+    Call `func` `rounds` times, split among `threads` threads, and return the
+    timings in milliseconds together with the throughput in calls per second
+
+    The threads use their own database connections, so the data they
+    read must be committed, e.g. by using a transactional database.
+    """
+    if threads == 1:
+        start = timeit.default_timer()
+        result = measure(func, rounds)
+        result["throughput"] = rounds / (timeit.default_timer() - start)
+        return result
+
+    timings = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(count):
+        thread_timings = []
+        try:
+            for _ in range(count):
+                start = timeit.default_timer()
+                func()
+                thread_timings.append((timeit.default_timer() - start) * 1000)
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            connection.close()
+        with lock:
+            timings.extend(thread_timings)
+
+    workers = [threading.Thread(target=worker, args=(rounds // threads,)) for _ in range(threads)]
+    start = timeit.default_timer()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = timeit.default_timer() - start
+
+    if errors:
+        raise errors[0]
+
+    result = _summarize(timings)
+    result["throughput"] = len(timings) / elapsed
+    return result
+
+
+def report(name, params, result):
+    print("{name} {params}: median={median:.3f}ms p95={p95:.3f}ms".format(
+        name=name,
+        params=" ".join("{}={}".format(key, value) for key, value in sorted(params.items())),
+        **result
+    ))
+
+    if OUTPUT_PATH:
+        with open(OUTPUT_PATH, "a") as output:
+            output.write(json.dumps({
+                "name": name,
+                "params": params,
+                "result": result,
+                "python": platform.python_version(),
+                "django": django.get_version()
+            }, sort_keys=True) + "\n")
+
+
+def create_api_access_with_permissions(user, groups_count, scopes_count, extra_scopes=()):
+    """
+    Create an API access granting `scopes_count` scopes to `user`
+    through `groups_count` groups
+    """
+    from django.contrib.auth.models import Group
+    from shuup_api_permission.models import APIPermissionGroups, APIPermissionScope
+
+    from .. import create_random_api_access
+
+    api_access = create_random_api_access()
+    scopes = [
+        APIPermissionScope.objects.create(identifier="benchmark_scope_%d" % index)
+        for index in range(scopes_count)
+    ]
+    scopes.extend(APIPermissionScope.objects.get_or_create(identifier=scope)[0] for scope in extra_scopes)
+
+    for index in range(groups_count):
+        group = Group.objects.create(name="benchmark group %d" % index)
+        user.groups.add(group)
+        api_permission_groups = APIPermissionGroups.objects.create(name="benchmark %d" % index)
+        api_permission_groups.groups.add(group)
+        api_permission_groups.permissions.add(*scopes)
+        api_access.permissions_groups.add(api_permission_groups)
+
+    return api_access
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import pytest
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_jwt_permission.utils import get_role_for, get_view_role
+from shuup.core.api.front_users import FrontUserViewSet
+from shuup.testing import factories
+
+from . import (
+    benchmark, create_api_access_with_permissions, measure_concurrent, report
+)
+
+PASSWORD = "benchmark"
+
+
+def _create_token(api_access, user):
+    response = APIClient().post("/api/auth/", format="json", data={
+        "api_key": api_access.key,
+        "api_secret": api_access.raw_secret,
+        "username": user.username,
+        "password": PASSWORD
+    })
+    assert response.status_code == status.HTTP_200_OK
+    return response.data["token"]
+
+
+def _refresh_token(jwt):
+    response = APIClient().post("/api/auth/refresh/", format="json", data={"token": jwt})
+    assert response.status_code == status.HTTP_200_OK
+
+
+def _verify_token(jwt):
+    response = APIClient().post("/api/auth/verify/", format="json", data={"token": jwt})
+    assert response.status_code == status.HTTP_200_OK
+
+
+def _get(jwt):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION="JWT " + jwt)
+    response = client.get("/api/shuup/front/user/me/", format="json")
+    assert response.status_code == status.HTTP_200_OK
+
+
+@benchmark
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize("flow", ["create", "refresh", "verify", "get"])
+@pytest.mark.parametrize("groups_count", [1, 10])
+@pytest.mark.parametrize("scopes_count", [10, 100])
+@pytest.mark.parametrize("threads", [1, 4])
+def test_benchmark_auth_flow(flow, groups_count, scopes_count, threads):
+    factories.get_default_shop()
+    user = factories.create_random_user()
+    user.set_password(PASSWORD)
+    user.save()
+
+    api_access = create_api_access_with_permissions(
+        user, groups_count, scopes_count,
+        extra_scopes=[get_view_role(FrontUserViewSet, get_role_for("get", "retrieve"))]
+    )
+    jwt = _create_token(api_access, user)
+
+    flows = {
+        "create": lambda: _create_token(api_access, user),
+        "refresh": lambda: _refresh_token(jwt),
+        "verify": lambda: _verify_token(jwt),
+        "get": lambda: _get(jwt)
+    }
+    # password hashing dominates the token creation, keep it short
+    rounds = 20 if flow == "create" else 200
+
+    result = measure_concurrent(flows[flow], threads=threads, rounds=rounds)
+    report("auth_flow", {
+        "flow": flow,
+        "groups": groups_count,
+        "scopes": scopes_count,
+        "threads": threads
+    }, result)
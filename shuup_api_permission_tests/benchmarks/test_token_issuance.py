@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import pytest
+from shuup.testing import factories
+
+from shuup_api_permission.utils import jwt_payload_handler
+
+from . import benchmark, create_api_access_with_permissions, measure, report
+
+
+@benchmark
+@pytest.mark.django_db
+@pytest.mark.parametrize("groups_count", [1, 10, 50])
+@pytest.mark.parametrize("scopes_count", [10, 100, 500])
+def test_benchmark_jwt_payload_handler(admin_user, groups_count, scopes_count):
+    shop = factories.get_default_shop()
+    api_access = create_api_access_with_permissions(admin_user, groups_count, scopes_count)
+
+    result = measure(lambda: jwt_payload_handler(admin_user, api_access, shop=shop))
+    report("jwt_payload_handler", {"groups": groups_count, "scopes": scopes_count}, result)
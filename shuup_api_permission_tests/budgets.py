@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.signals import request_finished
+from django.db import close_old_connections, connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.encoding import force_text
+
+# The maximum number of database queries and cache calls made by each flow once the
+# in-process caches are warm. Raise a budget only when the extra work is intended.
+BUDGETS = {
+    # user and group scopes, the secret is checked against the API access record and its stamp
+    "token_create": {"queries": 2, "cache_calls": 1},
+    # the API access record stamp, the anonymous scopes are cached
+    "token_create_anonymous": {"queries": 0, "cache_calls": 1},
+    # user and user groups, the scopes are reused when the permission fingerprint is unchanged
+    "token_refresh": {"queries": 2, "cache_calls": 0},
+    # user, fetched to derive the user claims again
+    "token_refresh_user_cache": {"queries": 1, "cache_calls": 0},
+    # user
+    "token_verify": {"queries": 1, "cache_calls": 0},
+    # user, through the authentication and both permission classes
+    "api_call": {"queries": 1, "cache_calls": 0},
+    "api_call_user_cache": {"queries": 0, "cache_calls": 0},
+    # update and API permission groups, the record stamp is renewed (once more on commit)
+    "api_access_save": {"queries": 2, "cache_calls": 1},
+}
+
+# the key prefixes of this package in the shared cache
+CACHE_KEY_PREFIXES = ("api_access", "api_rate_limit", "api_concurrency")
+
+# the backend methods counted, the nested calls they make to each other are not
+BACKEND_METHODS = ("get", "set", "add", "incr", "decr", "delete", "get_many", "set_many", "delete_many")
+
+
+def _is_own_key(key):
+    key = force_text(key)
+    if key.startswith("_version:"):
+        key = key[len("_version:"):]
+    return key.startswith(CACHE_KEY_PREFIXES)
+
+
+@contextmanager
+def counting_cache_calls(calls, alias="default"):
+    """
+    Append the calls made to the backend of the given cache to `calls`
+
+    Only the keys of this package are counted, including the version
+    lookups `shuup.core.cache` makes for them.
+    """
+    backend_class = type(caches[alias])
+    original_methods = dict((name, getattr(backend_class, name)) for name in BACKEND_METHODS)
+    depth = [0]
+
+    def counting(name, method):
+        def counted(self, key, *args, **kwargs):
+            if not depth[0]:
+                keys = list(key) if name.endswith("_many") else [key]
+                calls.extend((name, cache_key) for cache_key in keys if _is_own_key(cache_key))
+            depth[0] += 1
+            try:
+                return method(self, key, *args, **kwargs)
+            finally:
+                depth[0] -= 1
+        return counted
+
+    try:
+        for name, method in original_methods.items():
+            setattr(backend_class, name, counting(name, method))
+        yield calls
+    finally:
+        for name, method in original_methods.items():
+            setattr(backend_class, name, method)
+
+
+def finish_request():
+    """
+    Send `request_finished` as the end of a request would
+
+    The versions memoized by `shuup.core.cache` for the request are dropped.
+    The database connection is kept for the test transaction, as in the test client.
+    """
+    request_finished.disconnect(close_old_connections)
+    try:
+        request_finished.send(sender=None)
+    finally:
+        request_finished.connect(close_old_connections)
+
+
+@contextmanager
+def within_budget(flow):
+    """
+    Fail when the block exceeds the budget of the given flow
+
+    Cache calls are those reaching the shared cache backend for the keys
+    of this package, so changes in the cache usage of Shuup don't affect
+    the budgets. The block starts as a new request would.
+    """
+    budget = BUDGETS[flow]
+    cache_calls = []
+    finish_request()
+    with counting_cache_calls(cache_calls), CaptureQueriesContext(connection) as context:
+        yield
+
+    queries = [query["sql"] for query in context.captured_queries]
+    assert len(queries) <= budget["queries"], "%s made %d queries, the budget is %d:\n%s" % (
+        flow, len(queries), budget["queries"], "\n".join(queries)
+    )
+    assert len(cache_calls) <= budget["cache_calls"], "%s made %d cache calls, the budget is %d: %r" % (
+        flow, len(cache_calls), budget["cache_calls"], cache_calls
+    )
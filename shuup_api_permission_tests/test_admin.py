@@ -2,8 +2,12 @@
 from __future__ import unicode_literals
 
 import pytest
+from bs4 import BeautifulSoup
 from django.contrib.auth.models import Group
 from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import translation
 from rest_framework import status
 from rest_framework.test import APIClient
 from rest_jwt_permission.utils import get_role_for, get_view_role
@@ -12,15 +16,19 @@ from shuup.core.api.shop import ShopViewSet
 from shuup.testing import factories
 from shuup.testing.soup_utils import extract_form_fields
 
+from shuup_api_permission.admin_module.form_parts import set_scopes
+from shuup_api_permission.admin_module.forms import (
+    APIAccessForm, APIPermissionsForm, clear_api_endpoints, get_api_endpoints
+)
 from shuup_api_permission.models import APIPermissionGroups, APIPermissionScope, APIAccess
-from shuup_api_permission.utils import get_jwt_payload
+from shuup_api_permission.utils import jwt_payload_cache
 from shuup_tests.utils import SmartClient, printable_gibberish
 
 from . import create_random_api_access
 
 
 def setup_function(fn):
-    get_jwt_payload.cache_clear()
+    jwt_payload_cache.clear()
 
 
 @pytest.mark.django_db
@@ -41,14 +49,19 @@ def test_create_api_access(rf, admin_user):
     assert APIAccess.objects.count() == 0
 
     response = client.post(url, data=inputs)
-    assert response.status_code == 302
+    assert response.status_code == 200
 
     api_access = APIAccess.objects.first()
     assert api_access.enabled is False
     assert api_access.name == name
 
+    # the secret is displayed once, in the response, and never kept in the messages
+    soup = BeautifulSoup(response.content)
+    api_secret = soup.find("pre", id="api-secret").text.strip()
+    assert api_access.check_secret(api_secret)
+    assert api_secret not in str(client.cookies)
     edit_url = reverse("shuup_admin:api_access.edit", kwargs={"pk": api_access.pk})
-    assert response.url == edit_url
+    assert soup.find("a", href=edit_url)
 
     response, soup = client.response_and_soup(edit_url)
     assert response.status_code == 200
@@ -111,3 +124,89 @@ def test_create_api_permission_groups(rf, admin_user):
     assert permission_groups.groups.count() == 2
     assert group1 in permission_groups.groups.all()
     assert group2 in permission_groups.groups.all()
+
+
+@pytest.mark.django_db
+def test_set_scopes():
+    api_access = create_random_api_access()
+    APIPermissionScope.objects.create(identifier="scope1")
+
+    set_scopes(api_access.anonymous_permissions, ["scope1", "scope2"])
+    assert set(api_access.anonymous_permissions.values_list("identifier", flat=True)) == {"scope1", "scope2"}
+
+    set_scopes(api_access.anonymous_permissions, ["scope2", "scope3"])
+    assert set(api_access.anonymous_permissions.values_list("identifier", flat=True)) == {"scope2", "scope3"}
+    assert APIPermissionScope.objects.count() == 3
+
+    # the number of queries doesn't depend on the number of scopes
+    query_counts = []
+    for scopes_count in (3, 300):
+        api_access = create_random_api_access()
+        with CaptureQueriesContext(connection) as context:
+            set_scopes(api_access.anonymous_permissions, ["new_scope%d" % index for index in range(scopes_count)])
+        query_counts.append(len(context.captured_queries))
+        assert api_access.anonymous_permissions.count() == scopes_count
+    assert query_counts[0] == query_counts[1]
+
+
+@pytest.mark.django_db
+def test_set_scopes_created_concurrently(monkeypatch):
+    api_access = create_random_api_access()
+    bulk_create = APIPermissionScope.objects.bulk_create
+
+    def racing_bulk_create(objs, *args, **kwargs):
+        # another request creates one of the scopes first
+        APIPermissionScope.objects.create(identifier="scope2")
+        return bulk_create(objs, *args, **kwargs)
+
+    monkeypatch.setattr(APIPermissionScope.objects, "bulk_create", racing_bulk_create)
+    set_scopes(api_access.anonymous_permissions, ["scope1", "scope2"])
+    assert set(api_access.anonymous_permissions.values_list("identifier", flat=True)) == {"scope1", "scope2"}
+    assert APIPermissionScope.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_reset_api_access_secret(rf):
+    api_access = create_random_api_access()
+    api_secret = api_access.raw_secret
+    request = rf.post("/")
+    request.shop = factories.get_default_shop()
+
+    api_access = APIAccess.objects.get(pk=api_access.pk)
+    form = APIAccessForm(instance=api_access, request=request, data={"name": "name", "enabled": True})
+    assert form.is_valid(), form.errors
+    assert not hasattr(form.save(), "raw_secret")
+    assert api_access.check_secret(api_secret)
+
+    form = APIAccessForm(instance=api_access, request=request, data={
+        "name": "name", "enabled": True, "reset_secret": True
+    })
+    assert form.is_valid(), form.errors
+    api_access = form.save()
+    assert api_access.raw_secret != api_secret
+    api_access.refresh_from_db()
+    assert api_access.check_secret(api_access.raw_secret)
+    assert not api_access.check_secret(api_secret)
+
+
+def test_api_endpoints_cached():
+    clear_api_endpoints()
+    api_endpoints = get_api_endpoints()
+    assert get_api_endpoints() is api_endpoints
+
+    scope = get_view_role(ShopViewSet, get_role_for("get", "retrieve"))
+    form = APIPermissionsForm(initial=[scope])
+    field = form.fields["%sShopViewSet" % APIPermissionsForm.api_view_prefix]
+    assert scope in [choice[0] for choice in field.choices]
+    assert field.initial == [scope]
+
+    clear_api_endpoints()
+    assert get_api_endpoints() is not api_endpoints
+    assert get_api_endpoints() == api_endpoints
+
+    # the labels are translated, each language has its own catalogue
+    api_endpoints = get_api_endpoints()
+    with translation.override("fi"):
+        assert get_api_endpoints() is not api_endpoints
+        assert get_api_endpoints() is get_api_endpoints()
+    assert get_api_endpoints() is api_endpoints
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIRequestFactory
+from shuup.testing import factories
+
+from shuup_api_permission.access_cache import api_access_local_cache
+from shuup_api_permission.anonymous import (
+    anonymous_scopes_cache, anonymous_token_cache
+)
+from shuup_api_permission.api import APIAuthView
+from shuup_api_permission.models import APIPermissionScope
+from shuup_api_permission.revocation import revocation_list
+from shuup_api_permission.utils import jwt_payload_handler
+
+from . import create_random_api_access
+
+
+def setup_function(fn):
+    api_access_local_cache.clear()
+    anonymous_scopes_cache.clear()
+    anonymous_token_cache.clear()
+    revocation_list.clear()
+
+
+@pytest.mark.django_db
+def test_anonymous_scopes_cached():
+    shop = factories.get_default_shop()
+    api_access = create_random_api_access()
+    api_access.anonymous_permissions.add(APIPermissionScope.objects.create(identifier="scope1"))
+
+    assert jwt_payload_handler(AnonymousUser(), api_access, shop)["scopes"] == ["scope1"]
+    with CaptureQueriesContext(connection) as context:
+        assert jwt_payload_handler(AnonymousUser(), api_access, shop)["scopes"] == ["scope1"]
+    assert len(context.captured_queries) == 0
+
+    # changing the permissions bumps the permission version, thus the cache is not used
+    api_access.anonymous_permissions.add(APIPermissionScope.objects.create(identifier="scope2"))
+    assert jwt_payload_handler(AnonymousUser(), api_access, shop)["scopes"] == ["scope1", "scope2"]
+
+
+@pytest.mark.django_db
+def test_anonymous_token_reuse():
+    shop = factories.get_default_shop()
+    api_access = create_random_api_access()
+    view = APIAuthView.as_view({"post": "create"})
+
+    def create_token(api_secret=api_access.raw_secret):
+        request = APIRequestFactory().post("/api/auth/", {
+            "api_key": api_access.key,
+            "api_secret": api_secret
+        }, format="json")
+        request.shop = shop
+        return view(request)
+
+    # tokens are not reused by default
+    assert create_token().data["token"] != create_token().data["token"]
+
+    with override_settings(SHUUP_API_ANONYMOUS_TOKEN_REUSE_TIMEOUT=10):
+        jwt = create_token().data["token"]
+        with CaptureQueriesContext(connection) as context:
+            assert create_token().data["token"] == jwt
+        assert len(context.captured_queries) == 0
+
+        # the secret is still verified
+        assert create_token("wrong secret").status_code == status.HTTP_400_BAD_REQUEST
+
+        # changes in the API access make the token stale
+        api_access.name = "new name"
+        api_access.save()
+        assert create_token().data["token"] != jwt
+
+
+@pytest.mark.django_db
+@override_settings(SHUUP_API_ANONYMOUS_TOKEN_REUSE_TIMEOUT=10)
+def test_revoked_anonymous_token_not_reused():
+    shop = factories.get_default_shop()
+    api_access = create_random_api_access()
+    view = APIAuthView.as_view({"post": "create"})
+    data = {"api_key": api_access.key, "api_secret": api_access.raw_secret}
+
+    def create_token():
+        request = APIRequestFactory().post("/api/auth/", data, format="json")
+        request.shop = shop
+        return view(request).data["token"]
+
+    jwt = create_token()
+    assert create_token() == jwt
+
+    revoke_view = APIAuthView.as_view({"post": "revoke"})
+    request = APIRequestFactory().post("/api/auth/revoke/", {"token": jwt}, format="json")
+    request.shop = shop
+    assert revoke_view(request).status_code == status.HTTP_204_NO_CONTENT
+
+    new_jwt = create_token()
+    assert new_jwt != jwt
+    assert create_token() == new_jwt
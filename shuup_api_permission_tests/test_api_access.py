@@ -3,6 +3,7 @@ from __future__ import unicode_literals
 
 import pytest
 from django.contrib.auth.models import Group
+from django.test import override_settings
 from rest_framework import status
 from rest_framework.test import APIClient
 from rest_jwt_permission.utils import get_role_for, get_view_role
@@ -10,14 +11,17 @@ from shuup.core.api.front_users import FrontUserViewSet
 from shuup.core.api.shop import ShopViewSet
 from shuup.testing import factories
 
-from shuup_api_permission.models import APIPermissionGroups, APIPermissionScope
-from shuup_api_permission.utils import get_jwt_payload
+from shuup_api_permission.hashing import hash_secret
+from shuup_api_permission.models import (
+    APIAccess, APIPermissionGroups, APIPermissionScope
+)
+from shuup_api_permission.utils import jwt_payload_cache
 
 from . import create_random_api_access
 
 
 def setup_function(fn):
-    get_jwt_payload.cache_clear()
+    jwt_payload_cache.clear()
 
 
 @pytest.mark.django_db
@@ -46,7 +50,7 @@ def test_api_token():
         "username": user.username,
         "password": password,
         "api_key": api_access.key,
-        "api_secret": api_access.secret
+        "api_secret": api_access.raw_secret
     })
     assert response.status_code == status.HTTP_200_OK
     jwt = response.data["token"]
@@ -102,7 +106,7 @@ def test_open_api():
     api_access = create_random_api_access()
     response = client.post("/api/auth/", format="json", data={
         "api_key": api_access.key,
-        "api_secret": api_access.secret
+        "api_secret": api_access.raw_secret
     })
     assert response.status_code == status.HTTP_200_OK
     jwt = response.data["token"]
@@ -128,3 +132,41 @@ def test_open_api():
     response = client.get("/api/shuup/shop/%d/" % shop.id)
     assert response.status_code == status.HTTP_200_OK
     assert response.data["id"] == shop.id
+
+
+@pytest.mark.django_db
+def test_api_access_secret_hashed():
+    factories.get_default_shop()
+    api_access = create_random_api_access()
+    api_secret = api_access.raw_secret
+
+    # only the digest is stored
+    api_access.refresh_from_db()
+    assert api_access.secret == hash_secret(api_secret)
+    assert api_access.check_secret(api_secret)
+    assert not api_access.check_secret("wrong secret")
+    assert not api_access.check_secret("")
+
+    client = APIClient()
+    for secret, status_code in ((api_secret, status.HTTP_200_OK),
+                                (api_access.secret, status.HTTP_400_BAD_REQUEST),
+                                ("wrong secret", status.HTTP_400_BAD_REQUEST)):
+        response = client.post("/api/auth/", format="json", data={
+            "api_key": api_access.key,
+            "api_secret": secret
+        })
+        assert response.status_code == status_code
+
+    # a secret reset made through another instance takes effect right away
+    new_secret = APIAccess.objects.get(pk=api_access.pk).set_secret()
+    APIAccess.objects.filter(pk=api_access.pk).update(secret=hash_secret(new_secret))
+    for secret, status_code in ((api_secret, status.HTTP_400_BAD_REQUEST), (new_secret, status.HTTP_200_OK)):
+        response = client.post("/api/auth/", format="json", data={
+            "api_key": api_access.key,
+            "api_secret": secret
+        })
+        assert response.status_code == status_code
+
+    # the digest is keyed with the pepper
+    with override_settings(SHUUP_API_SECRET_PEPPER="pepper"):
+        assert not api_access.check_secret(api_secret)
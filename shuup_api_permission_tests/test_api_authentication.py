@@ -3,6 +3,9 @@ from __future__ import unicode_literals
 
 import pytest
 from django.contrib.auth.models import AnonymousUser, Group
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils.text import force_text
 from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.test import APIRequestFactory
@@ -13,11 +16,13 @@ from shuup.testing import factories
 
 from shuup_api_permission.authentication import APITokenAuthentication
 from shuup_api_permission.models import APIPermissionScope
-from shuup_api_permission.utils import get_jwt_payload
+from shuup_api_permission.user_cache import LazyUser, user_snapshot_cache
+from shuup_api_permission.utils import jwt_payload_cache
 
 
 def setup_function(fn):
-    get_jwt_payload.cache_clear()
+    jwt_payload_cache.clear()
+    user_snapshot_cache.clear()
 
 
 def test_api_authentication(admin_user):
@@ -54,3 +59,33 @@ def test_api_authentication(admin_user):
     admin_user.save()
     with pytest.raises(AuthenticationFailed):
         authentication.authenticate(request)
+
+
+@override_settings(SHUUP_API_USER_CACHE_ENABLED=True)
+def test_api_authentication_user_cache(admin_user):
+    authentication = APITokenAuthentication()
+    factory = APIRequestFactory()
+
+    request = factory.get('/api/shuup/shop/')
+    jwt = jwt_encode_handler({"username": admin_user.username, "user_id": admin_user.pk})
+    request.META["HTTP_AUTHORIZATION"] = "JWT %s" % jwt
+
+    user, token = authentication.authenticate(request)
+    assert user == admin_user
+
+    # now the user comes from the cache without touching the database
+    with CaptureQueriesContext(connection) as context:
+        user, token = authentication.authenticate(request)
+        assert isinstance(user, LazyUser)
+        assert user.pk == admin_user.pk
+        assert user.is_active
+    assert len(context.captured_queries) == 0
+
+    # the full user is loaded when needed
+    assert user.email == admin_user.email
+
+    # saving the user invalidates the cache
+    admin_user.is_active = False
+    admin_user.save()
+    with pytest.raises(AuthenticationFailed):
+        authentication.authenticate(request)
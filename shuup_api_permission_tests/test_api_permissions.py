@@ -1,26 +1,52 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+import threading
+import time
+
 import pytest
 from django.contrib.auth.models import AnonymousUser, Group
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.test import APIRequestFactory
-from rest_framework_jwt.utils import jwt_encode_handler
+from rest_framework_jwt.utils import jwt_decode_handler, jwt_encode_handler
 from rest_jwt_permission.utils import get_role_for, get_view_role
 from shuup.core import cache
 from shuup.core.api.shop import ShopViewSet
 from shuup.testing import factories
 
-from shuup_api_permission.models import APIPermissionGroups, APIPermissionScope
+from shuup_api_permission import access_cache, serializers
+from shuup_api_permission.access_cache import (
+    API_ACCESS_CACHE_KEY_FMT, API_ACCESS_STAMP_CACHE_KEY_FMT,
+    api_access_local_cache, get_api_access_record, get_missing_api_key_hits,
+    missing_api_access_cache
+)
+from shuup_api_permission.models import (
+    APIAccess, APIAccessGroupScopes, APIPermissionGroups, APIPermissionScope
+)
 from shuup_api_permission.permissions import (
-    API_ACCESS_CACHE_KEY_FMT, APIAccessPermission, APIScopePermission
+    _view_scopes, APIAccessPermission, APIScopePermission, get_view_scope
+)
+from shuup_api_permission.scope_catalogue import (
+    COMPACT_SCOPES_KEY, scope_catalogue
+)
+from shuup_api_permission.user_cache import user_groups_cache
+from shuup_api_permission.utils import (
+    jwt_payload_cache, jwt_payload_handler, PERMISSION_FINGERPRINT_KEY,
+    PERMISSION_VERSION_KEY
 )
-from shuup_api_permission.utils import get_jwt_payload, jwt_payload_handler
 
 from . import create_random_api_access
 
 
 def setup_function(fn):
-    get_jwt_payload.cache_clear()
+    jwt_payload_cache.clear()
+    api_access_local_cache.clear()
+    missing_api_access_cache.clear()
+    scope_catalogue.clear()
+    user_groups_cache.clear()
     cache.clear()
 
 
@@ -62,6 +88,81 @@ def test_api_access_permission():
     assert cache.get(API_ACCESS_CACHE_KEY_FMT.format(shop=shop.id, key=api_access.key)).id == api_access.id
 
 
+@pytest.mark.django_db
+def test_api_access_record_cache():
+    api_access = create_random_api_access()
+    record = get_api_access_record(api_access.key)
+    assert record.id == api_access.id
+    assert record.enabled
+
+    # the record is served from the process memory
+    cache.clear()
+    assert get_api_access_record(api_access.key) is record
+
+    # changes made in this process are visible right away
+    api_access.enabled = False
+    api_access.save()
+    assert get_api_access_record(api_access.key).enabled is False
+
+    # changes made by other processes are visible after the revalidation
+    APIAccess.objects.filter(pk=api_access.pk).update(enabled=True)
+    cache.set(API_ACCESS_STAMP_CACHE_KEY_FMT.format(key=api_access.key), "other process")
+    assert get_api_access_record(api_access.key).enabled is False
+    api_access_local_cache.set(api_access.key, (get_api_access_record(api_access.key), 0))
+    assert get_api_access_record(api_access.key).enabled is True
+
+
+@pytest.mark.django_db(transaction=True)
+def test_api_access_record_read_before_commit(monkeypatch):
+    api_access = create_random_api_access()
+    committed_record = get_api_access_record(api_access.key)
+    build_api_access_record = access_cache._build_api_access_record
+
+    with transaction.atomic():
+        api_access.enabled = False
+        api_access.save()
+
+        # another process rebuilds the record from the committed state before the commit
+        monkeypatch.setattr(access_cache, "_build_api_access_record", lambda api_key, stamp: (
+            committed_record._replace(stamp=stamp)
+        ))
+        api_access_local_cache.clear()
+        assert get_api_access_record(api_access.key).enabled is True
+        monkeypatch.setattr(access_cache, "_build_api_access_record", build_api_access_record)
+
+    # the stale record is discarded once the transaction is committed
+    assert get_api_access_record(api_access.key).enabled is False
+    api_access_local_cache.clear()
+    assert get_api_access_record(api_access.key).enabled is False
+
+
+@pytest.mark.django_db
+def test_api_access_negative_cache():
+    assert get_api_access_record("unknown") is None
+    with CaptureQueriesContext(connection) as context:
+        assert get_api_access_record("unknown") is None
+        assert get_api_access_record("unknown") is None
+    assert len(context.captured_queries) == 0
+    assert get_missing_api_key_hits() == {"unknown": 2}
+
+    # the uses are counted atomically
+    def use_unknown_key():
+        for _ in range(500):
+            get_api_access_record("unknown")
+
+    threads = [threading.Thread(target=use_unknown_key) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert get_missing_api_key_hits() == {"unknown": 2002}
+
+    # creating an API access with the key makes it available right away
+    api_access = create_random_api_access(key="unknown")
+    assert get_api_access_record("unknown").id == api_access.id
+    assert get_missing_api_key_hits() == {}
+
+
 @pytest.mark.parametrize("authenticated", [True, False])
 def test_api_scope_permissions(admin_user, authenticated):
     shop = factories.get_default_shop()
@@ -112,6 +213,14 @@ def test_api_scope_permissions(admin_user, authenticated):
     assert api_access_permission.has_permission(request, view)
 
 
+def test_view_scope():
+    view = ShopViewSet(action="list", method="get")
+    scope = get_view_scope(view, "GET")
+    assert scope == get_view_role(ShopViewSet, get_role_for("get", "list"))
+    assert _view_scopes[(ShopViewSet, "list", "GET")] == scope
+    assert get_view_scope(ShopViewSet(action="retrieve", method="get"), "GET") != scope
+
+
 def test_api_scope_permission_multiple_groups(admin_user):
     shop = factories.get_default_shop()
     api_access_permission = APIScopePermission()
@@ -153,3 +262,252 @@ def test_api_scope_permission_multiple_groups(admin_user):
     assert payload["scopes"][0] == scope
     request, view = get_request_view(jwt_encode_handler(payload), shop)
     assert api_access_permission.has_permission(request, view)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("groups_count", [1, 5, 20])
+def test_jwt_payload_handler_queries(admin_user, groups_count):
+    shop = factories.get_default_shop()
+    api_access = create_random_api_access()
+
+    scopes = set()
+    for index in range(groups_count):
+        group = Group.objects.create(name="g%d" % index)
+        admin_user.groups.add(group)
+        api_permission_groups = APIPermissionGroups.objects.create(name="schema %d" % index)
+        api_permission_groups.groups.add(group)
+        permission = APIPermissionScope.objects.create(identifier="scope_%d" % index)
+        api_permission_groups.permissions.add(permission)
+        api_access.permissions_groups.add(api_permission_groups)
+        scopes.add(permission.identifier)
+
+    # a permission group which the user is not part of
+    api_permission_groups = APIPermissionGroups.objects.create(name="other schema")
+    api_permission_groups.groups.add(Group.objects.create(name="other"))
+    api_permission_groups.permissions.add(APIPermissionScope.objects.create(identifier="other_scope"))
+    api_access.permissions_groups.add(api_permission_groups)
+
+    with CaptureQueriesContext(connection) as context:
+        payload = jwt_payload_handler(admin_user, api_access, shop=shop)
+    assert len(context.captured_queries) == 1
+    assert set(payload["scopes"]) == scopes
+
+
+@pytest.mark.django_db
+def test_api_access_group_scopes_maintenance():
+    api_access = create_random_api_access()
+    group1 = Group.objects.create(name="g1")
+    group2 = Group.objects.create(name="g2")
+    scope1 = APIPermissionScope.objects.create(identifier="scope1")
+    scope2 = APIPermissionScope.objects.create(identifier="scope2")
+
+    def get_group_scopes():
+        return dict(
+            (group_scopes.group_id, set(group_scopes.scopes.split("\n")))
+            for group_scopes in APIAccessGroupScopes.objects.filter(api_access=api_access)
+        )
+
+    api_permission_groups = APIPermissionGroups.objects.create(name="schema")
+    api_permission_groups.groups.add(group1)
+    api_permission_groups.permissions.add(scope1)
+    assert get_group_scopes() == {}
+
+    api_access.permissions_groups.add(api_permission_groups)
+    assert get_group_scopes() == {group1.pk: {"scope1"}}
+
+    api_permission_groups.groups.add(group2)
+    api_permission_groups.permissions.add(scope2)
+    assert get_group_scopes() == {group1.pk: {"scope1", "scope2"}, group2.pk: {"scope1", "scope2"}}
+
+    # changes from the reverse side of the relations
+    group2.api_permissions.remove(api_permission_groups)
+    assert get_group_scopes() == {group1.pk: {"scope1", "scope2"}}
+
+    scope2.delete()
+    assert get_group_scopes() == {group1.pk: {"scope1"}}
+
+    scope1.apipermissiongroups_set.clear()
+    assert get_group_scopes() == {}
+
+    api_permission_groups.permissions.add(scope1)
+    assert get_group_scopes() == {group1.pk: {"scope1"}}
+
+    api_access.permissions_groups.clear()
+    assert get_group_scopes() == {}
+
+
+@pytest.mark.django_db
+def test_api_scope_permission_compact_scopes():
+    shop = factories.get_default_shop()
+    api_scope_permission = APIScopePermission()
+    factory = APIRequestFactory()
+
+    api_access = create_random_api_access()
+    for index in range(100):
+        scope = APIPermissionScope.objects.create(identifier="shuup.core.api.SomeViewSet:%d" % index)
+        api_access.anonymous_permissions.add(scope)
+    scope = get_view_role(ShopViewSet, get_role_for("get", "list"))
+    api_access.anonymous_permissions.add(APIPermissionScope.objects.create(identifier=scope))
+
+    regular_jwt = jwt_encode_handler(jwt_payload_handler(AnonymousUser(), api_access, shop=shop))
+    with override_settings(SHUUP_API_JWT_COMPACT_SCOPES=True):
+        payload = jwt_payload_handler(AnonymousUser(), api_access, shop=shop)
+    assert "scopes" not in payload
+    assert COMPACT_SCOPES_KEY in payload
+
+    jwt = jwt_encode_handler(payload)
+    assert len(jwt) * 5 < len(regular_jwt)
+
+    # decoding doesn't depend on the catalogue loaded by this process
+    scope_catalogue.clear()
+    request = factory.get('/api/shuup/shop/')
+    request.META["HTTP_AUTHORIZATION"] = "JWT %s" % jwt
+    request.shop = shop
+    request.user = AnonymousUser()
+    assert api_scope_permission.has_permission(request, ShopViewSet(action="list", method="get"))
+
+
+@pytest.mark.django_db
+def test_api_access_outdated_token():
+    shop = factories.get_default_shop()
+    api_access_permission = APIAccessPermission()
+    factory = APIRequestFactory()
+
+    def get_request(jwt):
+        request = factory.get('/api/shuup/shop/')
+        request.META["HTTP_AUTHORIZATION"] = "JWT %s" % jwt
+        request.shop = shop
+        return request
+
+    api_access = create_random_api_access()
+    payload = jwt_payload_handler(AnonymousUser(), api_access, shop=shop)
+    assert payload[PERMISSION_VERSION_KEY] == 1
+    jwt = jwt_encode_handler(payload)
+    assert api_access_permission.has_permission(get_request(jwt), None)
+
+    # changing the permissions makes the token outdated
+    api_access.anonymous_permissions.add(APIPermissionScope.objects.create(identifier="scope"))
+    api_access.refresh_from_db()
+    assert api_access.permission_version == 2
+    with pytest.raises(PermissionDenied):
+        api_access_permission.has_permission(get_request(jwt), None)
+
+    with override_settings(SHUUP_API_REJECT_OUTDATED_TOKENS=False):
+        request = get_request(jwt)
+        assert api_access_permission.has_permission(request, None)
+        assert request.api_token_outdated
+
+    # changes in the permission groups also count
+    api_permission_groups = APIPermissionGroups.objects.create(name="schema")
+    api_access.permissions_groups.add(api_permission_groups)
+    payload = jwt_payload_handler(AnonymousUser(), api_access, shop=shop)
+    assert payload[PERMISSION_VERSION_KEY] == 3
+    jwt = jwt_encode_handler(payload)
+    assert api_access_permission.has_permission(get_request(jwt), None)
+
+    api_permission_groups.groups.add(Group.objects.create(name="g1"))
+    with pytest.raises(PermissionDenied):
+        api_access_permission.has_permission(get_request(jwt), None)
+
+    # saving an instance loaded before a change doesn't restore its old permission version
+    stale_api_access = APIAccess.objects.get(pk=api_access.pk)
+    payload = jwt_payload_handler(AnonymousUser(), stale_api_access, shop=shop)
+    api_access.anonymous_permissions.add(APIPermissionScope.objects.create(identifier="other scope"))
+    stale_api_access.name = "new name"
+    stale_api_access.save()
+    api_access.refresh_from_db()
+    assert api_access.name == "new name"
+    assert api_access.permission_version == stale_api_access.permission_version + 1
+    with pytest.raises(PermissionDenied):
+        api_access_permission.has_permission(get_request(jwt_encode_handler(payload)), None)
+
+    # tokens claiming a newer version than the cached record reload it from the database
+    stale_record = get_api_access_record(api_access.key)
+    api_access.anonymous_permissions.add(APIPermissionScope.objects.create(identifier="new scope"))
+    api_access_local_cache.set(api_access.key, (stale_record, time.time() + 60))
+    payload = jwt_payload_handler(AnonymousUser(), api_access, shop=shop)
+    assert api_access_permission.has_permission(get_request(jwt_encode_handler(payload)), None)
+    assert get_api_access_record(api_access.key).permission_version == payload[PERMISSION_VERSION_KEY]
+
+    # tokens claiming a version newer than the database are rejected
+    payload[PERMISSION_VERSION_KEY] += 1
+    with pytest.raises(PermissionDenied):
+        api_access_permission.has_permission(get_request(jwt_encode_handler(payload)), None)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("user_cache", [False, True])
+def test_token_refresh_reuses_scopes(admin_user, monkeypatch, user_cache):
+    shop = factories.get_default_shop()
+    api_access = create_random_api_access()
+    request = APIRequestFactory().post("/api/auth/refresh/")
+    request.shop = shop
+
+    payload_handler_calls = []
+
+    def payload_handler(*args, **kwargs):
+        payload_handler_calls.append(kwargs)
+        return jwt_payload_handler(*args, **kwargs)
+
+    monkeypatch.setattr(serializers, "jwt_payload_handler", payload_handler)
+
+    def refresh(jwt):
+        serializer = serializers.RefreshJSONWebTokenSerializer(data={"token": jwt}, context={"request": request})
+        assert serializer.is_valid(), serializer.errors
+        return serializer.validated_data["token"]
+
+    def add_group_scope(user, identifier):
+        group = Group.objects.create(name=identifier)
+        user.groups.add(group)
+        api_permission_groups = APIPermissionGroups.objects.create(name=identifier)
+        api_permission_groups.groups.add(group)
+        api_permission_groups.permissions.add(APIPermissionScope.objects.create(identifier=identifier))
+        api_access.permissions_groups.add(api_permission_groups)
+
+    add_group_scope(admin_user, "scope1")
+    payload = jwt_payload_handler(admin_user, api_access, shop=shop)
+    jwt = jwt_encode_handler(payload)
+
+    with override_settings(SHUUP_API_USER_CACHE_ENABLED=user_cache):
+        # nothing changed, the token is signed again with the same scopes
+        new_payload = jwt_decode_handler(refresh(jwt))
+        assert not payload_handler_calls
+        assert new_payload["scopes"] == ["scope1"]
+        assert new_payload[PERMISSION_FINGERPRINT_KEY] == payload[PERMISSION_FINGERPRINT_KEY]
+        assert new_payload["jti"] != payload["jti"]
+        assert new_payload["orig_iat"] == payload["orig_iat"]
+
+        # the user claims are derived again
+        admin_user.email = "new@example.com"
+        admin_user.save()
+        new_payload = jwt_decode_handler(refresh(jwt))
+        assert not payload_handler_calls
+        assert new_payload["email"] == "new@example.com"
+        assert new_payload["scopes"] == ["scope1"]
+
+        # groups without scopes for the API access don't matter
+        admin_user.groups.add(Group.objects.create(name="other"))
+        refresh(jwt)
+        assert not payload_handler_calls
+
+        # the scopes are computed again when the user groups grant other scopes
+        add_group_scope(admin_user, "scope2")
+        new_payload = jwt_decode_handler(refresh(jwt))
+        assert len(payload_handler_calls) == 1
+        assert isinstance(payload_handler_calls[0]["api_access"], APIAccess)
+        assert new_payload["scopes"] == ["scope1", "scope2"]
+
+        admin_user.groups.remove(Group.objects.get(name="scope1"))
+        new_payload = jwt_decode_handler(refresh(jwt))
+        assert len(payload_handler_calls) == 2
+        assert new_payload["scopes"] == ["scope2"]
+
+    # anonymous tokens too
+    payload = jwt_payload_handler(AnonymousUser(), api_access, shop=shop)
+    jwt = jwt_encode_handler(payload)
+    refresh(jwt)
+    assert len(payload_handler_calls) == 2
+
+    api_access.anonymous_permissions.add(APIPermissionScope.objects.create(identifier="anonymous_scope"))
+    assert jwt_decode_handler(refresh(jwt))["scopes"] == ["anonymous_scope"]
+    assert len(payload_handler_calls) == 3
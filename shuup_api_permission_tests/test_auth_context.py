@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import pytest
+from django.contrib.auth.models import Group
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_jwt.utils import jwt_encode_handler
+from rest_jwt_permission.utils import get_role_for, get_view_role
+from shuup.core import cache
+from shuup.core.api.shop import ShopViewSet
+from shuup.testing import factories
+
+from shuup_api_permission import utils
+from shuup_api_permission.access_cache import api_access_local_cache
+from shuup_api_permission.authentication import APITokenAuthentication
+from shuup_api_permission.context import get_auth_context
+from shuup_api_permission.models import (
+    APIPermissionGroups, APIPermissionScope
+)
+from shuup_api_permission.permissions import (
+    APIAccessPermission, APIScopePermission
+)
+from shuup_api_permission.user_cache import user_snapshot_cache
+from shuup_api_permission.utils import jwt_payload_cache, jwt_payload_handler
+
+from . import create_random_api_access
+from .budgets import counting_cache_calls, finish_request
+
+
+def setup_function(fn):
+    jwt_payload_cache.clear()
+    api_access_local_cache.clear()
+    user_snapshot_cache.clear()
+    cache.clear()
+
+
+@pytest.mark.django_db
+def test_auth_context_shared(admin_user, monkeypatch):
+    shop = factories.get_default_shop()
+    api_access = create_random_api_access()
+    scope = get_view_role(ShopViewSet, get_role_for("get", "list"))
+    group = Group.objects.create(name="g1")
+    admin_user.groups.add(group)
+    api_permission_groups = APIPermissionGroups.objects.create(name="schema")
+    api_permission_groups.groups.add(group)
+    api_permission_groups.permissions.add(APIPermissionScope.objects.create(identifier=scope))
+    api_access.permissions_groups.add(api_permission_groups)
+    jwt = jwt_encode_handler(jwt_payload_handler(admin_user, api_access, shop))
+
+    calls = {"decode": 0, "cache": 0}
+    jwt_decode_handler = utils.jwt_decode_handler
+
+    def counting_decode(*args, **kwargs):
+        calls["decode"] += 1
+        return jwt_decode_handler(*args, **kwargs)
+
+    monkeypatch.setattr(utils, "jwt_decode_handler", counting_decode)
+
+    def authorize():
+        # each call is a request of its own, counted at the shared cache backend
+        finish_request()
+        cache_calls = []
+        with counting_cache_calls(cache_calls):
+            calls["decode"] = 0
+            request = APIRequestFactory().get("/api/shuup/shop/", HTTP_AUTHORIZATION="JWT %s" % jwt)
+            request = Request(request, authenticators=[APITokenAuthentication()])
+            view = ShopViewSet(action="list", method="get")
+            assert request.user == admin_user
+            assert APIAccessPermission().has_permission(request, view)
+            assert APIScopePermission().has_permission(request, view)
+            context = get_auth_context(request)
+        calls["cache"] = len(cache_calls)
+        return context
+
+    jwt_payload_cache.clear()
+    context = authorize()
+    assert context.user == admin_user
+    assert context.api_access.id == api_access.id
+    assert scope in context.scopes
+    assert calls["decode"] == 1
+
+    # the local record is due for revalidation: a single shared cache lookup
+    api_access_local_cache.set(api_access.key, (context.api_access, 0))
+    jwt_payload_cache.clear()
+    authorize()
+    assert calls == {"decode": 1, "cache": 1}
+
+    # everything is served from the process memory
+    authorize()
+    assert calls == {"decode": 0, "cache": 0}
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import pytest
+from django.contrib.auth.models import Group
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_jwt.utils import jwt_encode_handler
+from rest_jwt_permission.utils import get_role_for, get_view_role
+from shuup.core import cache
+from shuup.core.api.shop import ShopViewSet
+from shuup.testing import factories
+
+from shuup_api_permission.access_cache import (
+    api_access_local_cache, missing_api_access_cache
+)
+from shuup_api_permission.admin_module.forms import APIAccessForm
+from shuup_api_permission.anonymous import (
+    anonymous_scopes_cache, anonymous_token_cache
+)
+from shuup_api_permission.api import APIAuthView
+from shuup_api_permission.authentication import APITokenAuthentication
+from shuup_api_permission.models import (
+    APIPermissionGroups, APIPermissionScope
+)
+from shuup_api_permission.permissions import (
+    APIAccessPermission, APIScopePermission
+)
+from shuup_api_permission.revocation import revocation_list
+from shuup_api_permission.user_cache import (
+    user_groups_cache, user_snapshot_cache
+)
+from shuup_api_permission.utils import jwt_payload_cache, jwt_payload_handler
+
+from . import create_random_api_access
+from .budgets import within_budget
+
+PASSWORD = "password"
+
+
+def setup_function(fn):
+    jwt_payload_cache.clear()
+    api_access_local_cache.clear()
+    missing_api_access_cache.clear()
+    anonymous_scopes_cache.clear()
+    anonymous_token_cache.clear()
+    user_snapshot_cache.clear()
+    user_groups_cache.clear()
+    revocation_list.clear()
+    cache.clear()
+
+
+def _create_api_access(user):
+    api_access = create_random_api_access()
+    scope = get_view_role(ShopViewSet, get_role_for("get", "list"))
+    group = Group.objects.create(name="g1")
+    user.groups.add(group)
+    api_permission_groups = APIPermissionGroups.objects.create(name="schema")
+    api_permission_groups.groups.add(group)
+    api_permission_groups.permissions.add(APIPermissionScope.objects.create(identifier=scope))
+    api_access.permissions_groups.add(api_permission_groups)
+    return api_access
+
+
+def _call_auth_view(action, data):
+    request = APIRequestFactory().post("/api/auth/", data, format="json")
+    request.shop = factories.get_default_shop()
+    response = APIAuthView.as_view({"post": action})(request)
+    assert response.status_code == status.HTTP_200_OK
+    return response.data
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("anonymous", [False, True])
+def test_token_create_budget(anonymous):
+    user = factories.create_random_user()
+    user.set_password(PASSWORD)
+    user.save()
+    api_access = _create_api_access(user)
+
+    data = {"api_key": api_access.key, "api_secret": api_access.raw_secret}
+    if not anonymous:
+        data.update(username=user.username, password=PASSWORD)
+
+    _call_auth_view("create", data)
+    with within_budget("token_create_anonymous" if anonymous else "token_create"):
+        _call_auth_view("create", data)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("user_cache", [False, True])
+def test_token_refresh_and_verify_budget(admin_user, user_cache):
+    api_access = _create_api_access(admin_user)
+    jwt = jwt_encode_handler(jwt_payload_handler(admin_user, api_access, factories.get_default_shop()))
+
+    with override_settings(SHUUP_API_USER_CACHE_ENABLED=user_cache):
+        _call_auth_view("refresh", {"token": jwt})
+        with within_budget("token_refresh_user_cache" if user_cache else "token_refresh"):
+            _call_auth_view("refresh", {"token": jwt})
+
+    with within_budget("token_verify"):
+        _call_auth_view("verify", {"token": jwt})
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("user_cache", [False, True])
+def test_api_call_budget(admin_user, user_cache):
+    api_access = _create_api_access(admin_user)
+    jwt = jwt_encode_handler(jwt_payload_handler(admin_user, api_access, factories.get_default_shop()))
+
+    def call():
+        request = APIRequestFactory().get("/api/shuup/shop/", HTTP_AUTHORIZATION="JWT %s" % jwt)
+        request = Request(request, authenticators=[APITokenAuthentication()])
+        view = ShopViewSet(action="list", method="get")
+        assert request.user.pk == admin_user.pk
+        assert APIAccessPermission().has_permission(request, view)
+        assert APIScopePermission().has_permission(request, view)
+
+    with override_settings(SHUUP_API_USER_CACHE_ENABLED=user_cache):
+        call()
+        with within_budget("api_call_user_cache" if user_cache else "api_call"):
+            call()
+
+
+@pytest.mark.django_db
+def test_api_access_save_budget(rf):
+    api_access = create_random_api_access()
+    request = rf.post("/")
+    request.shop = factories.get_default_shop()
+
+    form = APIAccessForm(instance=api_access, request=request, data={"name": "new name", "enabled": True})
+    with within_budget("api_access_save"):
+        assert form.is_valid(), form.errors
+        form.save()
+
+    api_access.refresh_from_db()
+    assert api_access.name == "new name"
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from rest_framework.exceptions import Throttled
+from rest_framework.test import APIRequestFactory
+from rest_framework_jwt.utils import jwt_encode_handler
+from shuup.core import cache
+from shuup.testing import factories
+
+from shuup_api_permission import concurrency
+from shuup_api_permission.access_cache import api_access_local_cache
+from shuup_api_permission.concurrency import (
+    CONCURRENCY_CACHE_KEY_FMT, concurrency_limiter, ConcurrencyLimiter
+)
+from shuup_api_permission.middleware import ShuupAPIPermissionMiddleware
+from shuup_api_permission.permissions import APIAccessPermission
+from shuup_api_permission.utils import jwt_payload_cache, jwt_payload_handler
+
+from . import create_random_api_access
+
+
+def setup_function(fn):
+    jwt_payload_cache.clear()
+    api_access_local_cache.clear()
+    cache.clear()
+
+
+def test_concurrency_limiter(monkeypatch):
+    monkeypatch.setattr(concurrency.time, "time", lambda: 600.0)
+    limiter = ConcurrencyLimiter()
+
+    first_lease = limiter.acquire("key", 2)
+    second_lease = limiter.acquire("key", 2)
+    assert first_lease and second_lease
+    assert limiter.acquire("key", 2) is None
+
+    limiter.release(first_lease)
+    assert limiter.get_active("key") == 1
+    third_lease = limiter.acquire("key", 2)
+    assert third_lease
+    limiter.release(second_lease)
+    limiter.release(third_lease)
+    assert limiter.get_active("key") == 0
+
+    # requests started by other processes in the previous window are still counted
+    cache.set(CONCURRENCY_CACHE_KEY_FMT.format(key="key", window=9), 2)
+    assert limiter.acquire("key", 2) is None
+    assert limiter.get_active("key") == 0
+    assert cache.get(CONCURRENCY_CACHE_KEY_FMT.format(key="key", window=10)) == 0
+
+
+@pytest.mark.django_db
+def test_api_access_concurrency_limit():
+    shop = factories.get_default_shop()
+    api_access = create_random_api_access(max_concurrent_requests=1)
+    jwt = jwt_encode_handler(jwt_payload_handler(AnonymousUser(), api_access, shop))
+    api_access_permission = APIAccessPermission()
+    middleware = ShuupAPIPermissionMiddleware()
+
+    def get_request():
+        request = APIRequestFactory().get("/api/shuup/shop/", HTTP_AUTHORIZATION="JWT %s" % jwt)
+        middleware.process_request(request)
+        return request
+
+    first_request = get_request()
+    assert api_access_permission.has_permission(first_request, None)
+    # the lease is only taken once per request
+    assert api_access_permission.has_permission(first_request, None)
+    assert concurrency_limiter.get_active(api_access.key) == 1
+
+    with pytest.raises(Throttled) as exc_info:
+        api_access_permission.has_permission(get_request(), None)
+    assert exc_info.value.wait
+
+    middleware.process_exception(first_request, Exception())
+    middleware.process_response(first_request, HttpResponse())
+    assert concurrency_limiter.get_active(api_access.key) == 0
+
+    request = get_request()
+    assert api_access_permission.has_permission(request, None)
+    middleware.process_response(request, HttpResponse())
+    assert concurrency_limiter.get_active(api_access.key) == 0
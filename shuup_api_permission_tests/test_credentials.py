@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import threading
+import time
+
+import pytest
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import Throttled
+from shuup.testing import factories
+
+from shuup_api_permission import credentials
+from shuup_api_permission.credentials import (
+    authenticate_credentials, credential_verifier, CredentialVerifier,
+    verified_credentials_cache
+)
+
+PASSWORD = "password"
+
+
+def setup_function(fn):
+    verified_credentials_cache.clear()
+    credential_verifier.shutdown()
+
+
+def _create_user():
+    user = factories.create_random_user()
+    user.set_password(PASSWORD)
+    user.save()
+    return user
+
+
+def test_credential_verifier_back_pressure(monkeypatch):
+    release = threading.Event()
+
+    def authenticate(credentials):
+        release.wait(5)
+        return credentials["username"]
+
+    monkeypatch.setattr(credentials, "_authenticate", authenticate)
+    verifier = CredentialVerifier()
+    results = []
+
+    with override_settings(SHUUP_API_AUTH_POOL_SIZE=1, SHUUP_API_AUTH_QUEUE_SIZE=1):
+        threads = [
+            threading.Thread(target=lambda: results.append(verifier.verify({"username": "user"})))
+            for _ in range(2)
+        ]
+        for thread in threads:
+            thread.start()
+        deadline = time.time() + 5
+        while verifier.get_pending() < 2 and time.time() < deadline:
+            time.sleep(0.001)
+        assert verifier.get_pending() == 2
+
+        # one verification is running and another one is waiting for a thread
+        with pytest.raises(Throttled) as exc_info:
+            verifier.verify({"username": "user"})
+        assert exc_info.value.wait == 1
+
+        release.set()
+        for thread in threads:
+            thread.join()
+        verifier.shutdown()
+
+    assert results == ["user", "user"]
+    assert verifier.get_pending() == 0
+
+
+def test_credential_verifier_pool_size(monkeypatch):
+    monkeypatch.setattr(credentials, "_authenticate", lambda credentials: credentials["username"])
+    verifier = CredentialVerifier()
+    with override_settings(SHUUP_API_AUTH_POOL_SIZE=1):
+        assert verifier.verify({"username": "user"}) == "user"
+        executor = verifier._executor
+        assert verifier.verify({"username": "user"}) == "user"
+        assert verifier._executor is executor
+
+    # the pool is created again with the new size
+    with override_settings(SHUUP_API_AUTH_POOL_SIZE=2):
+        assert verifier.verify({"username": "user"}) == "user"
+        assert verifier._executor is not executor
+    verifier.shutdown()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_pooled_authentication():
+    user = _create_user()
+    with override_settings(SHUUP_API_AUTH_POOL_SIZE=2):
+        assert authenticate_credentials("username", user.username, PASSWORD) == user
+        assert authenticate_credentials("username", user.username, "wrong") is None
+        assert credential_verifier.get_pending() == 0
+
+
+@pytest.mark.django_db
+def test_verified_credentials_cache(monkeypatch):
+    user = _create_user()
+    verifications = []
+
+    def verify(credentials, user=None):
+        verifications.append(credentials)
+        return original_verify(credentials, user=user)
+
+    original_verify = credential_verifier.verify
+    monkeypatch.setattr(credential_verifier, "verify", verify)
+
+    # disabled by default
+    assert authenticate_credentials("username", user.username, PASSWORD) == user
+    assert authenticate_credentials("username", user.username, PASSWORD) == user
+    assert len(verifications) == 2
+
+    with override_settings(SHUUP_API_CREDENTIALS_CACHE_TIMEOUT=10):
+        # the user loaded for the cache key is verified as is
+        with CaptureQueriesContext(connection) as context:
+            assert authenticate_credentials("username", user.username, PASSWORD) == user
+        assert len(context.captured_queries) == 1
+        assert authenticate_credentials("username", user.username, PASSWORD) == user
+        assert len(verifications) == 3
+
+        # only the verified credentials are cached
+        assert authenticate_credentials("username", user.username, "wrong") is None
+        assert authenticate_credentials("username", user.username, "wrong") is None
+        assert len(verifications) == 5
+
+        # changing the password invalidates the cache
+        user.set_password("new password")
+        user.save()
+        assert authenticate_credentials("username", user.username, PASSWORD) is None
+        assert len(verifications) == 6
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.core.urlresolvers import reverse
+from django.test import override_settings
+from django.utils.encoding import force_text
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_jwt.utils import jwt_encode_handler
+from shuup.testing import factories
+from shuup_tests.utils import SmartClient
+
+from shuup_api_permission.access_cache import api_access_local_cache
+from shuup_api_permission.authentication import APITokenAuthentication
+from shuup_api_permission.instrumentation import (
+    get_collector, Histogram, reset_collector
+)
+from shuup_api_permission.permissions import APIAccessPermission
+from shuup_api_permission.utils import jwt_payload_cache, jwt_payload_handler
+
+from . import create_random_api_access
+
+
+def setup_function(fn):
+    jwt_payload_cache.clear()
+    api_access_local_cache.clear()
+    reset_collector()
+
+
+def test_histogram():
+    histogram = Histogram(buckets=(1, 10))
+    for value in (0.5, 1, 5, 50):
+        histogram.observe(value)
+    assert histogram.get_cumulative_counts() == [(1, 2), (10, 3), (float("inf"), 4)]
+    assert histogram.count == 4
+    assert histogram.sum == 56.5
+
+
+def test_instrumentation_disabled():
+    assert get_collector() is None
+
+    with override_settings(SHUUP_API_INSTRUMENTATION_ENABLED=True):
+        collector = get_collector()
+        assert collector is not None
+        assert get_collector() is collector
+    assert get_collector() is None
+
+
+@pytest.mark.django_db
+@override_settings(SHUUP_API_INSTRUMENTATION_ENABLED=True)
+def test_instrumentation(admin_user):
+    shop = factories.get_default_shop()
+    api_access = create_random_api_access()
+    jwt = jwt_encode_handler(jwt_payload_handler(AnonymousUser(), api_access, shop))
+
+    request = APIRequestFactory().get("/api/shuup/shop/", HTTP_AUTHORIZATION="JWT %s" % jwt)
+    request = Request(request, authenticators=[APITokenAuthentication()])
+    assert request.user
+    assert APIAccessPermission().has_permission(request, None)
+
+    histograms = get_collector().histograms
+    assert histograms["jwt_decode"].count == 1
+    assert histograms["authentication"].count == 1
+    assert histograms["api_access_permission"].count == 1
+
+    client = SmartClient()
+    client.force_login(admin_user)
+    response = client.get(reverse("shuup_admin:api_access.metrics"))
+    assert response.status_code == 200
+    content = force_text(response.content)
+    assert 'shuup_api_permission_duration_milliseconds_count{stage="jwt_decode"} 1' in content
+    assert 'shuup_api_permission_cache_misses_total{cache="jwt_payload"} 1' in content
+
+    with override_settings(SHUUP_API_INSTRUMENTATION_ENABLED=False):
+        assert client.get(reverse("shuup_admin:api_access.metrics")).status_code == 404
+
+    # the admin requires a staff user
+    client.logout()
+    assert client.get(reverse("shuup_admin:api_access.metrics")).status_code == 302
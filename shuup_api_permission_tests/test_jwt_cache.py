@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import time
+
+import pytest
+from django.test import override_settings
+from rest_framework.exceptions import PermissionDenied
+from rest_framework_jwt.utils import jwt_encode_handler
+
+from shuup_api_permission.local_cache import LocalCache
+from shuup_api_permission.utils import (
+    DecodedJWT, get_jwt_payload, get_jwt_scopes, jwt_payload_cache
+)
+
+
+def setup_function(fn):
+    jwt_payload_cache.clear()
+
+
+def test_jwt_payload_cached():
+    jwt = jwt_encode_handler({"api_key": "abc", "exp": int(time.time()) + 300})
+    assert get_jwt_payload(jwt)["api_key"] == "abc"
+    assert jwt_payload_cache.get_stats()["misses"] == 1
+
+    assert get_jwt_payload(jwt)["api_key"] == "abc"
+    stats = jwt_payload_cache.get_stats()
+    assert stats["hits"] == 1
+    assert stats["size"] == 1
+
+
+def test_jwt_payload_expired_not_reused():
+    jwt = jwt_encode_handler({"api_key": "abc", "exp": int(time.time()) - 10})
+    # even if the payload is still in cache, it must not be returned after the expiration
+    jwt_payload_cache.set(jwt, DecodedJWT({"api_key": "abc"}), timeout=-1)
+    with pytest.raises(PermissionDenied):
+        get_jwt_payload(jwt)
+
+
+def test_jwt_scopes_cached():
+    jwt = jwt_encode_handler({"api_key": "abc", "scopes": ["scope1", "scope2"]})
+    scopes = get_jwt_scopes(jwt)
+    assert scopes == frozenset(["scope1", "scope2"])
+    assert get_jwt_scopes(jwt) is scopes
+
+
+def test_local_cache_size_bound():
+    cache = LocalCache("SHUUP_API_JWT_CACHE_SIZE")
+    with override_settings(SHUUP_API_JWT_CACHE_SIZE=2):
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1  # "b" is now the least recently used
+        cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.get_stats()["evictions"] == 1
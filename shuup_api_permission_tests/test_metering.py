@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import json
+import time
+
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.http import HttpResponse
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+from rest_framework_jwt.utils import jwt_encode_handler
+from shuup.testing import factories
+
+from shuup_api_permission.access_cache import api_access_local_cache
+from shuup_api_permission.metering import save_usage, usage_meter
+from shuup_api_permission.middleware import ShuupAPIPermissionMiddleware
+from shuup_api_permission.models import APIAccessUsage
+from shuup_api_permission.permissions import APIAccessPermission
+from shuup_api_permission.utils import jwt_payload_cache, jwt_payload_handler
+from shuup_tests.utils import SmartClient
+
+from . import create_random_api_access
+
+
+def setup_function(fn):
+    jwt_payload_cache.clear()
+    api_access_local_cache.clear()
+    usage_meter.clear()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_usage_meter_flush():
+    api_access = create_random_api_access()
+    usage_meter.record(api_access.id, "scope", 2, 10)
+    usage_meter.record(api_access.id, "scope", 2, 20)
+    usage_meter.record(api_access.id, "scope", 5, 5)
+    # nothing is written until the counters are flushed
+    assert not APIAccessUsage.objects.exists()
+
+    usage_meter.flush()
+    usage = APIAccessUsage.objects.get(api_access=api_access, status_class=2)
+    assert usage.request_count == 2
+    assert usage.total_duration == 30
+    assert APIAccessUsage.objects.get(api_access=api_access, status_class=5).request_count == 1
+
+    # existing rows are updated, in the background once the threshold is reached
+    with override_settings(SHUUP_API_METERING_FLUSH_SIZE=1):
+        usage_meter.record(api_access.id, "scope", 2, 10)
+        usage_meter.join()
+    usage.refresh_from_db()
+    assert usage.request_count == 3
+    assert usage.total_duration == 40
+    assert APIAccessUsage.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_save_usage_queries():
+    api_access = create_random_api_access()
+    period = int(time.time())
+    save_usage({(api_access.id, period, "scope", status_class): [1, 10] for status_class in (2, 4)})
+
+    counters = {(api_access.id, period, "scope", status_class): [2, 5] for status_class in (2, 4, 5)}
+    with CaptureQueriesContext(connection) as context:
+        save_usage(counters)
+    # the API accesses, the existing rows, a single update and a single insert
+    assert len([query for query in context.captured_queries if "SAVEPOINT" not in query["sql"]]) == 4
+
+    assert sorted(APIAccessUsage.objects.values_list("status_class", "request_count", "total_duration")) == [
+        (2, 3, 15), (4, 3, 15), (5, 2, 5)
+    ]
+
+
+@pytest.mark.django_db(transaction=True)
+@override_settings(SHUUP_API_METERING_ENABLED=True, SHUUP_API_METERING_FLUSH_SIZE=1)
+def test_middleware_records_usage():
+    shop = factories.get_default_shop()
+    api_access = create_random_api_access()
+    middleware = ShuupAPIPermissionMiddleware()
+
+    jwt = jwt_encode_handler(jwt_payload_handler(AnonymousUser(), api_access, shop))
+    request = APIRequestFactory().get("/api/shuup/shop/", HTTP_AUTHORIZATION="JWT %s" % jwt)
+    middleware.process_request(request)
+    assert APIAccessPermission().has_permission(request, None)
+    middleware.process_response(request, HttpResponse(status=201))
+    usage_meter.join()
+
+    usage = APIAccessUsage.objects.get(api_access=api_access)
+    assert usage.status_class == 2
+    assert usage.request_count == 1
+
+    # requests without API access are not counted
+    request = APIRequestFactory().get("/api/shuup/shop/")
+    middleware.process_request(request)
+    middleware.process_response(request, HttpResponse(status=403))
+    usage_meter.join()
+    assert APIAccessUsage.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_api_access_list_usage(admin_user):
+    factories.get_default_shop()
+    api_access = create_random_api_access()
+    usage_meter.record(api_access.id, "scope", 2, 30)
+    usage_meter.record(api_access.id, "scope", 5, 10)
+    usage_meter.flush()
+
+    client = SmartClient()
+    client.force_login(admin_user)
+    response = client.get(reverse("shuup_admin:api_access.list"), data={"jq": json.dumps({"perPage": 100, "page": 1})})
+    assert response.status_code == 200
+    item = json.loads(response.content.decode("utf-8"))["items"][0]
+    assert item["requests_24h"] == 2
+    assert item["errors_24h"] == 1
+    assert item["average_duration_24h"] == "20.0 ms"
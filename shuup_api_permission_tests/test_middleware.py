@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.test import override_settings, RequestFactory
+from django.utils.encoding import force_bytes
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_jwt.utils import jwt_encode_handler
+from shuup.testing import factories
+
+from shuup_api_permission.access_cache import api_access_local_cache
+from shuup_api_permission.authentication import APITokenAuthentication
+from shuup_api_permission.middleware import ShuupAPIPermissionMiddleware
+from shuup_api_permission.permissions import APIAccessPermission
+from shuup_api_permission.utils import jwt_payload_cache, jwt_payload_handler
+
+from . import create_random_api_access
+
+
+def setup_function(fn):
+    jwt_payload_cache.clear()
+    api_access_local_cache.clear()
+
+
+def test_middleware_lazy_payload():
+    factory = RequestFactory()
+    middleware = ShuupAPIPermissionMiddleware()
+
+    jwt = jwt_encode_handler({"api_key": "abc"})
+    request = factory.get("/api/shuup/shop/", HTTP_AUTHORIZATION="JWT %s" % jwt)
+    middleware.process_request(request)
+    # nothing is decoded until the payload is used
+    assert jwt_payload_cache.get_stats()["size"] == 0
+    assert request.jwt_payload["api_key"] == "abc"
+    assert jwt_payload_cache.get_stats()["size"] == 1
+    assert request.jwt_value == force_bytes(jwt)
+
+    # without a token, the attributes are plain None
+    request = factory.get("/api/shuup/shop/")
+    middleware.process_request(request)
+    assert request.jwt_payload is None
+    assert request.jwt_value is None
+
+    # the header of another scheme is only read when used
+    request = factory.get("/api/shuup/shop/", HTTP_AUTHORIZATION="Basic abc")
+    middleware.process_request(request)
+    assert not request.jwt_payload
+    assert not request.jwt_value
+
+
+def test_middleware_malformed_header():
+    factory = RequestFactory()
+    middleware = ShuupAPIPermissionMiddleware()
+
+    # malformed headers don't break the request unless the payload is used
+    request = factory.get("/", HTTP_AUTHORIZATION="JWT abc def")
+    middleware.process_request(request)
+    with pytest.raises(PermissionDenied):
+        bool(request.jwt_payload)
+
+    with override_settings(SHUUP_API_PERMISSION_URL_PREFIXES=["/api/"]):
+        request = factory.get("/", HTTP_AUTHORIZATION="JWT abc def")
+        middleware.process_request(request)
+        assert not hasattr(request, "jwt_payload")
+
+
+@pytest.mark.django_db
+def test_middleware_server_timing():
+    shop = factories.get_default_shop()
+    middleware = ShuupAPIPermissionMiddleware()
+
+    def get_response(api_access):
+        jwt = jwt_encode_handler(jwt_payload_handler(AnonymousUser(), api_access, shop))
+        request = APIRequestFactory().get("/api/shuup/shop/", HTTP_AUTHORIZATION="JWT %s" % jwt)
+        middleware.process_request(request)
+        drf_request = Request(request, authenticators=[APITokenAuthentication()])
+        assert drf_request.user
+        assert APIAccessPermission().has_permission(drf_request, None)
+        return middleware.process_response(request, HttpResponse())
+
+    api_access = create_random_api_access()
+    assert "Server-Timing" not in get_response(api_access)
+
+    with override_settings(SHUUP_API_SERVER_TIMING_ENABLED=True):
+        stages = [timing.split(";")[0] for timing in get_response(api_access)["Server-Timing"].split(", ")]
+        assert stages == ["token", "decode", "user", "api_key"]
+
+    api_access = create_random_api_access(server_timing=True)
+    assert "api_key;dur=" in get_response(api_access)["Server-Timing"]
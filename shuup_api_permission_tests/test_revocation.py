@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import threading
+import time
+
+import pytest
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_jwt_permission.utils import get_role_for, get_view_role
+from shuup.core import cache
+from shuup.core.api.shop import ShopViewSet
+from shuup.testing import factories
+
+from shuup_api_permission.models import APIPermissionScope, RevokedToken
+from shuup_api_permission.revocation import BloomFilter, revocation_list
+from shuup_api_permission.utils import jwt_payload_cache
+
+from . import create_random_api_access
+
+
+def setup_function(fn):
+    jwt_payload_cache.clear()
+    revocation_list.clear()
+    cache.clear()
+
+
+def test_bloom_filter():
+    bloom_filter = BloomFilter(2 ** 16, 7)
+    values = ["token-%d" % index for index in range(1000)]
+    for value in values:
+        bloom_filter.add(value)
+
+    assert all(value in bloom_filter for value in values)
+    false_positives = sum(1 for index in range(1000) if "other-%d" % index in bloom_filter)
+    assert false_positives < 50
+
+
+@pytest.mark.django_db
+def test_revoke_token():
+    shop = factories.get_default_shop()
+    client = APIClient()
+
+    api_access = create_random_api_access()
+    scope = get_view_role(ShopViewSet, get_role_for("get", "retrieve"))
+    api_access.anonymous_permissions.add(APIPermissionScope.objects.get_or_create(identifier=scope)[0])
+
+    response = client.post("/api/auth/", format="json", data={
+        "api_key": api_access.key,
+        "api_secret": api_access.raw_secret
+    })
+    assert response.status_code == status.HTTP_200_OK
+    jwt = response.data["token"]
+    other_jwt = client.post("/api/auth/", format="json", data={
+        "api_key": api_access.key,
+        "api_secret": api_access.raw_secret
+    }).data["token"]
+
+    client.credentials(HTTP_AUTHORIZATION="JWT " + jwt)
+    response = client.get("/api/shuup/shop/%d/" % shop.id)
+    assert response.status_code == status.HTTP_200_OK
+
+    client.credentials(HTTP_AUTHORIZATION="")
+    response = client.post("/api/auth/revoke/", format="json", data={"token": jwt})
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert RevokedToken.objects.count() == 1
+
+    client.credentials(HTTP_AUTHORIZATION="JWT " + jwt)
+    response = client.get("/api/shuup/shop/%d/" % shop.id)
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    # revoked tokens can't be refreshed
+    client.credentials(HTTP_AUTHORIZATION="")
+    response = client.post("/api/auth/refresh/", format="json", data={"token": jwt})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    # other tokens of the same API key keep working, also for other processes
+    revocation_list.clear()
+    client.credentials(HTTP_AUTHORIZATION="JWT " + other_jwt)
+    response = client.get("/api/shuup/shop/%d/" % shop.id)
+    assert response.status_code == status.HTTP_200_OK
+
+    client.credentials(HTTP_AUTHORIZATION="JWT " + jwt)
+    response = client.get("/api/shuup/shop/%d/" % shop.id)
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db
+def test_revoked_tokens_cached():
+    revocation_list.revoke("revoked", int(time.time()) + 60)
+    # as seen by another process
+    revocation_list.clear()
+
+    assert revocation_list.is_revoked("revoked")
+    with CaptureQueriesContext(connection) as context:
+        assert revocation_list.is_revoked("revoked")
+        assert not revocation_list.is_revoked("other")
+    assert len(context.captured_queries) == 0
+
+
+@pytest.mark.django_db
+@override_settings(SHUUP_API_REVOCATION_FILTER_SIZE=1, SHUUP_API_REVOCATION_HASH_COUNT=1)
+def test_filter_false_positives_cached():
+    # with a single bit, every token matches the filter
+    revocation_list.revoke("revoked")
+    revocation_list.clear()
+
+    assert not revocation_list.is_revoked("other")
+    with CaptureQueriesContext(connection) as context:
+        assert not revocation_list.is_revoked("other")
+    assert len(context.captured_queries) == 0
+
+    revocation_list.revoke("other")
+    with CaptureQueriesContext(connection) as context:
+        assert revocation_list.is_revoked("other")
+    assert len(context.captured_queries) == 0
+
+
+@pytest.mark.django_db
+def test_revocation_list_single_sync(monkeypatch):
+    bloom_filter = revocation_list.sync()
+    syncing = threading.Event()
+    release = threading.Event()
+    syncs = []
+
+    def sync():
+        syncs.append(True)
+        syncing.set()
+        release.wait(5)
+        return bloom_filter
+
+    monkeypatch.setattr(revocation_list, "sync", sync)
+    monkeypatch.setattr(revocation_list, "_synced_at", 0)
+    thread = threading.Thread(target=revocation_list.is_revoked, args=("token",))
+    thread.start()
+    syncing.wait(5)
+
+    # the other threads keep using the current filter while it is rebuilt
+    assert not revocation_list.is_revoked("token")
+    release.set()
+    thread.join()
+    assert len(syncs) == 1
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.test import override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_jwt.utils import jwt_encode_handler
+from shuup.core import cache
+from shuup.testing import factories
+
+from shuup_api_permission import throttling
+from shuup_api_permission.access_cache import api_access_local_cache
+from shuup_api_permission.authentication import APITokenAuthentication
+from shuup_api_permission.throttling import (
+    APIAccessRateThrottle, RATE_LIMIT_CACHE_KEY_FMT, token_buckets,
+    TokenBucket
+)
+from shuup_api_permission.utils import jwt_payload_cache, jwt_payload_handler
+
+from . import create_random_api_access
+
+
+def setup_function(fn):
+    jwt_payload_cache.clear()
+    api_access_local_cache.clear()
+    token_buckets.clear()
+    cache.clear()
+
+
+@override_settings(SHUUP_API_RATE_LIMIT_SYNC_INTERVAL=60)
+def test_token_bucket(monkeypatch):
+    now = [1200.0]
+    monkeypatch.setattr(throttling.time, "time", lambda: now[0])
+
+    bucket = TokenBucket("key", 3)
+    assert bucket.consume() == 0
+    assert bucket.consume() == 0
+    assert bucket.consume() == 0
+    # a token is added every 20 seconds
+    assert bucket.consume() == pytest.approx(20)
+
+    now[0] += 10
+    assert bucket.consume() == pytest.approx(10)
+    now[0] += 10
+    assert bucket.consume() == 0
+
+
+@override_settings(SHUUP_API_RATE_LIMIT_SYNC_INTERVAL=0)
+def test_token_bucket_reconciliation(monkeypatch):
+    monkeypatch.setattr(throttling.time, "time", lambda: 1200.0)
+    cache_key = RATE_LIMIT_CACHE_KEY_FMT.format(key="key", window=20)
+
+    # other processes already used 9 of the 10 requests
+    cache.set(cache_key, 9)
+    bucket = TokenBucket("key", 10)
+    assert bucket.consume() == 0
+    assert bucket.consume() > 0
+    assert cache.get(cache_key) == 10
+
+
+@pytest.mark.django_db
+def test_api_access_rate_throttle(admin_user):
+    shop = factories.get_default_shop()
+    api_access = create_random_api_access(rate_limit=2, user_rate_limit=1)
+
+    def allow_request(user):
+        jwt = jwt_encode_handler(jwt_payload_handler(user, api_access, shop))
+        request = APIRequestFactory().get("/api/shuup/shop/", HTTP_AUTHORIZATION="JWT %s" % jwt)
+        request = Request(request, authenticators=[APITokenAuthentication()])
+        assert request.user
+        throttle = APIAccessRateThrottle()
+        return throttle.allow_request(request, None), throttle.wait()
+
+    assert allow_request(admin_user) == (True, None)
+    # the user limit is exceeded
+    allowed, wait_time = allow_request(admin_user)
+    assert not allowed
+    assert wait_time > 0
+
+    # anonymous users are only limited by the API access limit
+    assert allow_request(AnonymousUser())[0]
+    assert not allow_request(AnonymousUser())[0]
+
+    # requests made with other API accesses are not affected
+    api_access = create_random_api_access()
+    assert allow_request(AnonymousUser())[0]